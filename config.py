@@ -2,31 +2,87 @@
 Configuration for MediFriend Healthcare Platform
 """
 import os
-import yaml
+import json
+from typing import Final
+
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_SECRET_KEY = os.environ.get('SECRET_KEY') or 'mysupersecretkey-change-in-production'
+
+# keys.json is preferred when present: the keys are a flat map the C JSON
+# parser reads directly. keys.yaml remains supported.
+KEYS_JSON_PATH = f"{_BASE}/keys.json"
+KEYS_YAML_PATH = f"{_BASE}/keys.yaml"
+
+# Parsed keys files, keyed by path: (mtime, size, data)
+_KEYS_CACHE = {}
+
+
+def _parse_yaml(source):
+    """
+    Parse YAML with LibYAML when available. yaml is imported here so startups
+    served by keys.json never pay its import cost.
+    """
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+    return yaml.load(source, Loader=SafeLoader)
 
 
 # Load API keys
 def load_keys():
-    keys_path = os.path.join(os.path.dirname(__file__), 'keys.yaml')
-    with open(keys_path, 'r') as f:
-        return yaml.safe_load(f)
+    """Load keys.json or keys.yaml, reusing the last parse while the file is unchanged"""
+    keys_path = KEYS_JSON_PATH if os.path.exists(KEYS_JSON_PATH) else KEYS_YAML_PATH
+    st = os.stat(keys_path)
+    
+    cached = _KEYS_CACHE.get(keys_path)
+    if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        return cached[2]
+    
+    if keys_path.endswith('.json'):
+        with open(keys_path, 'rb') as f:
+            data = json.load(f)
+        _KEYS_CACHE[keys_path] = (st.st_mtime, st.st_size, data)
+        return data
+    
+    with open(keys_path, 'rb') as f:
+        data = _parse_yaml(f.read())
+    
+    _KEYS_CACHE[keys_path] = (st.st_mtime, st.st_size, data)
+    return data
+
+
+class _KeysValue:
+    """
+    Class attribute resolved from the keys file on first access, so importing
+    config never touches the keys file
+    """
+    def __init__(self, name):
+        self.name = name
+    
+    def __get__(self, obj, owner=None):
+        return load_keys().get(self.name)
 
 
 class Config:
+    # Read as a namespace by app.config.from_object(); never instantiated
+    __slots__ = ()
+    
     # Flask configuration
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'mysupersecretkey-change-in-production'
+    SECRET_KEY: Final[str] = _SECRET_KEY
     
     # Database
-    DB_PATH = os.path.join(os.path.dirname(__file__), 'hms.db')
+    DB_PATH = f"{_BASE}/hms.db"
     
     # Upload folder
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
+    UPLOAD_FOLDER = f"{_BASE}/static/uploads"
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
+    ALLOWED_EXTENSIONS = frozenset(('png', 'jpg', 'jpeg', 'pdf'))
     
     # Gemini API
-    keys = load_keys()
-    GEMINI_API_KEY = keys.get('GEMINI_API_KEY')
+    GEMINI_API_KEY = _KeysValue('GEMINI_API_KEY')
     
     # Session configuration
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -38,12 +94,15 @@ class Config:
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
     MAIL_USE_TLS = True
-    MAIL_USERNAME = keys.get('MAIL_USERNAME')  # Add to keys.yaml
-    MAIL_PASSWORD = keys.get('MAIL_PASSWORD')  # Add to keys.yaml (App Password for Gmail)
-    MAIL_DEFAULT_SENDER = keys.get('MAIL_USERNAME')
+    MAIL_USERNAME = _KeysValue('MAIL_USERNAME')  # Add to keys.yaml
+    MAIL_PASSWORD = _KeysValue('MAIL_PASSWORD')  # Add to keys.yaml (App Password for Gmail)
+    MAIL_DEFAULT_SENDER = _KeysValue('MAIL_USERNAME')
+
+
+_ALLOWED = Config.ALLOWED_EXTENSIONS
 
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in _ALLOWED
@@ -2,11 +2,24 @@
 Database Connection and Initialization for MediFriend
 """
 import sqlite3
+import json
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, wraps
 from datetime import date, datetime, timedelta, timezone
 import secrets
 import string
-from models import ALL_MODELS
+from models import ALL_MODELS, INDEX_STATEMENTS, SCHEMA_STATEMENTS, TRIGGER_STATEMENTS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # IST timezone (UTC+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
@@ -22,45 +35,342 @@ def get_ist_today():
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'hms.db')
 
+# Idle connections kept open by the pool
+POOL_SIZE = 8
+
+# Prepared statements kept per connection, keyed by SQL text. Large enough to
+# hold every query in the app, so pooled connections never re-parse one.
+STATEMENT_CACHE_SIZE = 512
+
+# Applied once to every new connection. journal_mode is persistent in the
+# database file, so WAL is switched on by init_db() instead. The busy timeout
+# comes from sqlite3.connect(timeout=5.0).
+_CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",      # Safe with WAL, one sync per checkpoint
+    "PRAGMA cache_size = -65536",       # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+
 
 def get_db_connection():
     """
-    Get a new database connection with row factory for dictionary-like access
+    Get a new database connection with row factory for dictionary-like access.
+    Queries should borrow a pooled connection via _pool.acquire() instead.
     """
-    conn = sqlite3.connect(DB_PATH)
+    # Pooled connections are handed between threads, one thread at a time
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
-    # Enable foreign key constraints
-    conn.execute("PRAGMA foreign_keys = ON")
+    # Enable foreign key constraints and tune the connection
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+class _ConnectionPool:
+    """
+    Bounded pool of open connections shared across threads, so a query does not
+    pay for connect() and the connection PRAGMAs every time. When every pooled
+    connection is busy a new one is opened, and closed again on release.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+    
+    @contextmanager
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = get_db_connection()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+    
+    def _release(self, conn):
+        # Never hand out a connection with half a transaction on it
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def reset(self):
+        """Forget pooled connections; a forked child must not share them with its parent"""
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+
+_pool = _ConnectionPool(POOL_SIZE)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_pool.reset)
+
+
+# Marks a cache miss, since None is a valid cached value
+_MISSING = object()
+
+
+class _TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after being set.
+    Cached values are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value, or _MISSING if absent or expired"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Read-mostly profile lookups hit on nearly every request; the update_* and
+# insert_* writers below invalidate them. Misses (None) are never cached, so
+# a freshly registered user is visible immediately. Invalidation only reaches
+# the current process: with several server workers, the others keep serving
+# the old profile until the entry expires (30 seconds). The login lookup is
+# not cached, so password changes apply everywhere at once, and the cached
+# profiles leave out password_hash.
+_user_cache = _TTLCache()
+_doctor_details_cache = _TTLCache()
+_patient_details_cache = _TTLCache()
+
+# Rating badges and search-as-you-type results. Rating and doctor profile
+# writers invalidate them; search results are dropped wholesale on any
+# change, since one doctor can appear under many queries. As with the
+# profiles, other workers keep the old rating or results until the entry
+# expires (30 seconds).
+_doctor_rating_cache = _TTLCache()
+_doctor_search_cache = _TTLCache(maxsize=4096)
+
+# Full doctor listings for the booking form and the map, invalidated along
+# with the search results by every doctor, profile and rating writer. Other
+# workers may show the old listing for up to a minute. Every request gets the
+# same list, so callers must treat it as read-only.
+_doctor_list_cache = _TTLCache(maxsize=8, ttl=60)
+
+# Chatbot context, rebuilt several times within one chat turn as the model
+# calls back into overlapping data. Kept only for a few seconds, and dropped
+# wholesale by the appointment, prescription and vital sign writers.
+_patient_context_cache = _TTLCache(maxsize=256, ttl=5)
+
+
+@lru_cache(maxsize=1024)
+def _parse_json(text):
+    """
+    Parse a stored JSON column (medicines_json, extracted_values_json).
+    Cached by the text itself, so the chatbot re-reading the same patient's
+    records skips re-parsing; results are shared and must be treated as read-only.
+    Uses orjson when installed.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # Stricter than json: NaN, Infinity and huge ints; let json decide
+            pass
+    return json.loads(text)
+
+
+def _cached_fetchone(cache, key, query, params):
+    """Serve a single-row lookup from `cache`, querying and caching on a miss"""
+    row = cache.get(key)
+    if row is _MISSING:
+        row = execute_query(query, params, fetchone=True)
+        if row is not None:
+            cache.set(key, row)
+    return row
+
+
+def _patient_context_cached(func):
+    """
+    Memoize a chatbot context builder per patient in _patient_context_cache.
+    Callers within the TTL share the same returned object, so lists and dicts
+    it returns must be treated as read-only.
+    """
+    @wraps(func)
+    def wrapper(patient_id):
+        key = (func.__name__, patient_id)
+        value = _patient_context_cache.get(key)
+        if value is _MISSING:
+            value = func(patient_id)
+            _patient_context_cache.set(key, value)
+        return value
+    return wrapper
+
+
+def _cached_fetchall(cache, key, query, params=()):
+    """Serve a multi-row read from `cache`, querying and caching on a miss"""
+    rows = cache.get(key)
+    if rows is _MISSING:
+        rows = execute_query(query, params, fetchall=True)
+        cache.set(key, rows)
+    return rows
+
+
+def enable_wal(conn=None):
+    """
+    Switch the database to write-ahead logging, so readers no longer block the
+    writer. The mode is stored in the database file and only needs setting once.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            return enable_wal(conn)
+    
+    mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    if mode.lower() != 'wal':
+        print(f"⚠️ Could not enable WAL, journal mode is {mode}")
+    return mode
+
+
+def create_tables(conn=None):
+    """
+    Create any model table missing from the database. Tables derived from
+    others (see populate_sql) are filled from their sources when created.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            create_tables(conn)
+            conn.commit()
+        return
+    
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for model in ALL_MODELS:
+        if model.TABLE_NAME in existing:
+            continue
+        conn.execute(model.create_table_sql())
+        if hasattr(model, 'populate_sql'):
+            conn.execute(model.populate_sql())
+
+
+def create_columns(conn=None):
+    """
+    Add any model column missing from an existing table (see added_columns_sql),
+    filling it from the model's backfill statement.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            create_columns(conn)
+            conn.commit()
+        return
+    
+    for model in ALL_MODELS:
+        if not hasattr(model, 'added_columns_sql'):
+            continue
+        existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({model.TABLE_NAME})")}
+        for column, definition, backfill_sql in model.added_columns_sql():
+            if column in existing:
+                continue
+            conn.execute(f"ALTER TABLE {model.TABLE_NAME} ADD COLUMN {column} {definition}")
+            conn.execute(backfill_sql)
+
+
+def create_indexes(conn=None):
+    """
+    Create any model index missing from the database. Every index is
+    IF NOT EXISTS, so this is cheap to run against an existing database.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            create_indexes(conn)
+            conn.commit()
+        return
+    
+    for index_sql in INDEX_STATEMENTS:
+        conn.execute(index_sql)
+
+
+def create_triggers(conn=None):
+    """
+    Create any model trigger missing from the database. Every trigger is
+    IF NOT EXISTS, so this is cheap to run against an existing database.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            create_triggers(conn)
+            conn.commit()
+        return
+    
+    for trigger_sql in TRIGGER_STATEMENTS:
+        conn.execute(trigger_sql)
+
+
+def optimize_db(conn=None):
+    """
+    Let SQLite refresh planner statistics where they are stale (PRAGMA optimize).
+    Unlike a full ANALYZE, this usually does no work at all on a startup.
+    """
+    if conn is None:
+        with _pool.acquire() as conn:
+            optimize_db(conn)
+            conn.commit()
+        return
+    
+    conn.execute("PRAGMA optimize")
+
+
 def init_db():
     """
     Initialize the database by creating all tables from models.
-    Only creates database if it doesn't exist.
+    Only creates database if it doesn't exist; an existing one gets any new
+    tables, columns, indexes and triggers.
     """
     # Check if database already exists
     if os.path.exists(DB_PATH):
         print(f"✅ Database already exists at: {DB_PATH}")
+        # Schema upgrades in one explicit transaction: sqlite3 would otherwise
+        # autocommit each DDL statement on its own
+        with transaction() as conn:
+            conn.execute("BEGIN")
+            create_tables(conn)
+            create_columns(conn)
+            create_indexes(conn)
+            create_triggers(conn)
+        enable_wal()
+        optimize_db()
         return
     
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     print("🏥 Initializing MediFriend Database...")
     
     try:
-        # Create all tables
         for model in ALL_MODELS:
             print(f"   Creating table: {model.TABLE_NAME}")
-            cursor.execute(model.create_table_sql())
-            
-            # Create indexes if available
-            if hasattr(model, 'create_indexes_sql'):
-                for index_sql in model.create_indexes_sql():
-                    cursor.execute(index_sql)
         
-        conn.commit()
+        # Every table, index and trigger in one script and one transaction
+        conn.executescript("BEGIN;\n" + ";\n".join(SCHEMA_STATEMENTS) + ";\nCOMMIT;")
+        enable_wal(conn)
         print("✅ Database initialized successfully!")
         print(f"📁 Database location: {DB_PATH}")
         
@@ -72,7 +382,8 @@ def init_db():
         conn.close()
 
 
-def execute_query(query, params=(), fetchone=False, fetchall=False, commit=False):
+def execute_query(query, params=(), fetchone=False, fetchall=False, commit=False, as_dict=True, conn=None,
+                  returning=False):
     """
     Helper function to execute SQL queries
     
@@ -82,36 +393,87 @@ def execute_query(query, params=(), fetchone=False, fetchall=False, commit=False
         fetchone: Return single row
         fetchall: Return all rows
         commit: Commit changes (for INSERT/UPDATE/DELETE)
+        as_dict: Copy rows into dicts. Pass False to get the sqlite3.Row objects
+                 as-is when rows are only read by key, e.g. in templates; Rows
+                 are read-only, have no .get() and are not JSON-serializable
+        conn: Connection to run on, so several reads can share one borrowed
+              connection; by default one is borrowed from the pool per call
+        returning: The statement ends in RETURNING <column>; commit and return
+                   that column of the first returned row, or None if no row
     
     Returns:
         Query results or lastrowid for INSERT operations
     """
-    conn = get_db_connection()
+    if conn is None:
+        with _pool.acquire() as conn:
+            return execute_query(query, params, fetchone, fetchall, commit, as_dict, conn, returning)
+    
     cursor = conn.cursor()
     
     try:
         cursor.execute(query, params)
         
+        if returning:
+            # The returned row must be read before the statement is committed
+            result = cursor.fetchone()
+            conn.commit()
+            return result[0] if result is not None else None
+        
         if commit:
             conn.commit()
             return cursor.lastrowid
         
         if fetchone:
             result = cursor.fetchone()
-            return dict(result) if result else None
+            if result is None or not as_dict:
+                return result
+            return dict(result)
         
         if fetchall:
             results = cursor.fetchall()
+            if not as_dict:
+                return results
             return [dict(row) for row in results]
         
         return None
         
     except Exception as e:
-        if commit:
+        if commit or returning:
             conn.rollback()
         raise e
-    finally:
-        conn.close()
+
+
+def execute_query_iter(query, params=()):
+    """
+    Yield the sqlite3.Row results of a query one at a time, for callers that
+    stream rows rather than hold them all. The borrowed connection goes back
+    to the pool once the rows run out or the generator is closed.
+    """
+    with _pool.acquire() as conn:
+        yield from conn.execute(query, params)
+
+
+@contextmanager
+def transaction():
+    """
+    Run several statements on one pooled connection as a single transaction.
+    Commits when the block exits, rolls back if it raises.
+    
+    Usage:
+        with transaction() as conn:
+            conn.execute(...)
+    """
+    with _pool.acquire() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# Meeting codes draw uniformly from lowercase letters and digits
+_MEET_CODE_CHARS = string.ascii_lowercase + string.digits
 
 
 def generate_meet_link():
@@ -121,14 +483,33 @@ def generate_meet_link():
     Format: https://meet.jit.si/MediFriend-xxxxx (random 12-char code)
     """
     # Generate random string of 12 characters (letters + numbers)
-    chars = string.ascii_lowercase + string.digits
-    code = ''.join(secrets.choice(chars) for _ in range(12))
+    code = ''.join(secrets.choice(_MEET_CODE_CHARS) for _ in range(12))
     
     # Use Jitsi Meet - free and works immediately without any setup
     # Format: MediFriend-{random_code} to make room names unique
     return f"https://meet.jit.si/MediFriend-{code}"
 
 
+# iCalendar body shared by every generated .ics file
+_ICS_TEMPLATE = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//MediFriend//Healthcare Management System//EN
+CALSCALE:GREGORIAN
+METHOD:PUBLISH
+BEGIN:VEVENT
+UID:{uid}
+DTSTAMP:{dtstamp}
+DTSTART:{dtstart}
+DTEND:{dtend}
+SUMMARY:Medical Consultation - Dr. {doctor_name}
+DESCRIPTION:{description}
+LOCATION:{location}
+STATUS:CONFIRMED
+SEQUENCE:0
+END:VEVENT
+END:VCALENDAR"""
+
+
 def generate_ics_calendar(appointment_data):
     """
     Generate iCalendar (.ics) file content for appointment
@@ -148,7 +529,6 @@ def generate_ics_calendar(appointment_data):
     )
     
     # Calculate end time (assume 30 min consultation)
-    from datetime import timedelta
     end_datetime = appointment_datetime + timedelta(minutes=30)
     
     # Format dates in iCalendar format (YYYYMMDDTHHMMSS)
@@ -172,25 +552,15 @@ def generate_ics_calendar(appointment_data):
             description += f"\\n\\nSymptoms: {appointment_data['symptoms']}"
     
     # Build iCalendar content
-    ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//MediFriend//Healthcare Management System//EN
-CALSCALE:GREGORIAN
-METHOD:PUBLISH
-BEGIN:VEVENT
-UID:{uid}
-DTSTAMP:{dtstamp}
-DTSTART:{dtstart}
-DTEND:{dtend}
-SUMMARY:Medical Consultation - Dr. {appointment_data['doctor_name']}
-DESCRIPTION:{description}
-LOCATION:{location}
-STATUS:CONFIRMED
-SEQUENCE:0
-END:VEVENT
-END:VCALENDAR"""
-    
-    return ics_content
+    return _ICS_TEMPLATE.format_map({
+        'uid': uid,
+        'dtstamp': dtstamp,
+        'dtstart': dtstart,
+        'dtend': dtend,
+        'doctor_name': appointment_data['doctor_name'],
+        'description': description,
+        'location': location,
+    })
 
 
 def insert_user(full_name, email, password_hash, role, phone=None, gender=None, dob=None):
@@ -208,7 +578,12 @@ def get_user_by_email(email):
     """
     Get user by email
     """
-    query = "SELECT * FROM users WHERE email = ?"
+    # Only what login needs; signup merely checks for existence
+    query = """
+        SELECT id, email, password_hash, full_name, role
+        FROM users
+        WHERE email = ?
+    """
     return execute_query(query, (email,), fetchone=True)
 
 
@@ -216,8 +591,12 @@ def get_user_by_id(user_id):
     """
     Get user by ID
     """
-    query = "SELECT * FROM users WHERE id = ?"
-    return execute_query(query, (user_id,), fetchone=True)
+    query = """
+        SELECT id, full_name, email, role, phone, gender, dob, created_at
+        FROM users
+        WHERE id = ?
+    """
+    return _cached_fetchone(_user_cache, user_id, query, (user_id,))
 
 
 def insert_patient_details(user_id, blood_group=None, allergies=None, chronic_conditions=None, emergency_contact=None):
@@ -228,7 +607,9 @@ def insert_patient_details(user_id, blood_group=None, allergies=None, chronic_co
         INSERT INTO patient_details (user_id, blood_group, allergies, chronic_conditions, emergency_contact)
         VALUES (?, ?, ?, ?, ?)
     """
-    return execute_query(query, (user_id, blood_group, allergies, chronic_conditions, emergency_contact), commit=True)
+    result = execute_query(query, (user_id, blood_group, allergies, chronic_conditions, emergency_contact), commit=True)
+    _patient_details_cache.pop(user_id)
+    return result
 
 
 def insert_doctor_details(user_id, specialization, qualification=None, experience_years=0, consultation_fee=0.0, schedule_json=None, clinic_address=None, latitude=None, longitude=None, consultation_modes='PHYSICAL'):
@@ -239,40 +620,53 @@ def insert_doctor_details(user_id, specialization, qualification=None, experienc
         INSERT INTO doctor_details (user_id, specialization, qualification, experience_years, consultation_fee, schedule_json, clinic_address, latitude, longitude, consultation_modes)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
-    return execute_query(query, (user_id, specialization, qualification, experience_years, consultation_fee, schedule_json, clinic_address, latitude, longitude, consultation_modes), commit=True)
+    result = execute_query(query, (user_id, specialization, qualification, experience_years, consultation_fee, schedule_json, clinic_address, latitude, longitude, consultation_modes), commit=True)
+    _doctor_details_cache.pop(user_id)
+    _doctor_search_cache.clear()
+    _doctor_list_cache.clear()
+    return result
+
+
+# CROSS JOIN keeps doctor_details as the outer loop, so rows come off
+# idx_doctor_rating already in rating order. The users columns are listed
+# rather than u.* so password_hash never reaches a page's tojson.
+_ALL_DOCTORS_SQL = """
+    SELECT u.id, u.full_name, u.email, u.role, u.phone, u.gender, u.dob, u.created_at,
+           d.specialization, d.experience_years, d.consultation_fee,
+           d.average_rating, d.total_ratings, d.clinic_address, d.latitude, d.longitude, d.consultation_modes, d.qualification
+    FROM doctor_details d
+    CROSS JOIN users u ON u.id = d.user_id
+    WHERE u.role = 'DOCTOR'
+    ORDER BY d.average_rating DESC, u.full_name
+"""
 
 
 def get_all_doctors():
     """
     Get all doctors with their details including ratings
+    The list is cached and shared between requests; treat it as read-only.
     """
-    query = """
-        SELECT u.*, d.specialization, d.experience_years, d.consultation_fee,
-               d.average_rating, d.total_ratings, d.clinic_address, d.latitude, d.longitude, d.consultation_modes, d.qualification
-        FROM users u
-        JOIN doctor_details d ON u.id = d.user_id
-        WHERE u.role = 'DOCTOR'
-        ORDER BY d.average_rating DESC, u.full_name
-    """
-    return execute_query(query, fetchall=True)
+    return _cached_fetchall(_doctor_list_cache, 'all', _ALL_DOCTORS_SQL)
 
 
 def get_doctors_with_location():
     """
     Get all doctors who have clinic location set (for map view)
+    The list is cached and shared between requests; treat it as read-only.
     """
+    # Outer loop over idx_doctor_rating, as in get_all_doctors
     query = """
         SELECT u.id, u.full_name, u.email, u.phone,
                d.specialization, d.experience_years, d.consultation_fee,
                d.average_rating, d.total_ratings, d.clinic_address, d.latitude, d.longitude, d.consultation_modes, d.qualification
-        FROM users u
-        JOIN doctor_details d ON u.id = d.user_id
+        FROM doctor_details d
+        CROSS JOIN users u ON u.id = d.user_id
         WHERE u.role = 'DOCTOR' 
         AND d.latitude IS NOT NULL 
         AND d.longitude IS NOT NULL
         ORDER BY d.average_rating DESC, u.full_name
     """
-    return execute_query(query, fetchall=True)
+    return _cached_fetchall(_doctor_list_cache, 'with_location', query)
 
 
 def get_doctor_details(doctor_id):
@@ -280,13 +674,14 @@ def get_doctor_details(doctor_id):
     Get doctor details by user ID including ratings
     """
     query = """
-        SELECT u.*, d.specialization, d.qualification, d.experience_years, 
+        SELECT u.id, u.full_name, u.email, u.role, u.phone, u.gender, u.dob, u.created_at,
+               d.specialization, d.qualification, d.experience_years, 
                d.consultation_fee, d.schedule_json, d.average_rating, d.total_ratings
         FROM users u
         JOIN doctor_details d ON u.id = d.user_id
         WHERE u.id = ?
     """
-    return execute_query(query, (doctor_id,), fetchone=True)
+    return _cached_fetchone(_doctor_details_cache, doctor_id, query, (doctor_id,))
 
 
 def get_patient_details(patient_id):
@@ -294,12 +689,23 @@ def get_patient_details(patient_id):
     Get patient details by user ID
     """
     query = """
-        SELECT u.*, p.blood_group, p.allergies, p.chronic_conditions, p.emergency_contact
+        SELECT u.id, u.full_name, u.email, u.role, u.phone, u.gender, u.dob, u.created_at,
+               p.blood_group, p.allergies, p.chronic_conditions, p.emergency_contact
         FROM users u
         LEFT JOIN patient_details p ON u.id = p.user_id
         WHERE u.id = ?
     """
-    return execute_query(query, (patient_id,), fetchone=True)
+    return _cached_fetchone(_patient_details_cache, patient_id, query, (patient_id,))
+
+
+def _invalidate_user(user_id):
+    """Drop every cached profile row that includes this user's users columns"""
+    _user_cache.pop(user_id)
+    _doctor_details_cache.pop(user_id)
+    _patient_details_cache.pop(user_id)
+    # Keyed by search text, which is not known here; user updates are rare
+    _doctor_search_cache.clear()
+    _doctor_list_cache.clear()
 
 
 def update_user_basic_info(user_id, full_name, phone, gender, dob):
@@ -311,7 +717,9 @@ def update_user_basic_info(user_id, full_name, phone, gender, dob):
         SET full_name = ?, phone = ?, gender = ?, dob = ?
         WHERE id = ?
     """
-    return execute_query(query, (full_name, phone, gender, dob, user_id), commit=True)
+    result = execute_query(query, (full_name, phone, gender, dob, user_id), commit=True)
+    _invalidate_user(user_id)
+    return result
 
 
 def update_patient_details(user_id, blood_group, allergies, chronic_conditions, emergency_contact):
@@ -323,7 +731,9 @@ def update_patient_details(user_id, blood_group, allergies, chronic_conditions,
         SET blood_group = ?, allergies = ?, chronic_conditions = ?, emergency_contact = ?
         WHERE user_id = ?
     """
-    return execute_query(query, (blood_group, allergies, chronic_conditions, emergency_contact, user_id), commit=True)
+    result = execute_query(query, (blood_group, allergies, chronic_conditions, emergency_contact, user_id), commit=True)
+    _patient_details_cache.pop(user_id)
+    return result
 
 
 def update_doctor_details(user_id, specialization, qualification, experience_years, consultation_fee):
@@ -335,7 +745,11 @@ def update_doctor_details(user_id, specialization, qualification, experience_yea
         SET specialization = ?, qualification = ?, experience_years = ?, consultation_fee = ?
         WHERE user_id = ?
     """
-    return execute_query(query, (specialization, qualification, experience_years, consultation_fee, user_id), commit=True)
+    result = execute_query(query, (specialization, qualification, experience_years, consultation_fee, user_id), commit=True)
+    _doctor_details_cache.pop(user_id)
+    _doctor_search_cache.clear()
+    _doctor_list_cache.clear()
+    return result
 
 
 # ==================== APPOINTMENT FUNCTIONS ====================
@@ -352,24 +766,26 @@ def create_appointment(patient_id, doctor_id, date, time, symptoms=None, consult
     query = """
         INSERT INTO appointments (patient_id, doctor_id, date, time, symptoms, status, consultation_mode, meet_link)
         VALUES (?, ?, ?, ?, ?, 'PENDING', ?, ?)
+        RETURNING id
+    """
+    # Notification for the doctor, prefixed with the patient's name straight
+    # from users; nothing is inserted if the patient does not exist
+    notification_query = """
+        INSERT INTO notifications (user_id, type, message, link, appointment_id)
+        SELECT ?, 'APPOINTMENT_REQUESTED', full_name || ?, '/doctor/appointments', ?
+        FROM users
+        WHERE id = ?
     """
-    appointment_id = execute_query(query, (patient_id, doctor_id, date, time, symptoms, consultation_mode, meet_link), commit=True)
+    mode_text = "Online" if consultation_mode == 'ONLINE' else "Physical"
+    message_suffix = f" has requested a {mode_text} appointment for {date} at {time}"
     
-    # Get patient name for notification
-    patient_query = "SELECT full_name FROM users WHERE id = ?"
-    patient = execute_query(patient_query, (patient_id,), fetchone=True)
-    
-    if appointment_id and patient:
-        # Create notification for doctor
-        mode_text = "Online" if consultation_mode == 'ONLINE' else "Physical"
-        message = f"{patient['full_name']} has requested a {mode_text} appointment for {date} at {time}"
-        create_notification(
-            user_id=doctor_id,
-            notification_type='APPOINTMENT_REQUESTED',
-            message=message,
-            link='/doctor/appointments',
-            appointment_id=appointment_id
-        )
+    # Appointment and doctor notification are written in one transaction
+    with transaction() as conn:
+        appointment_id = conn.execute(
+            query, (patient_id, doctor_id, date, time, symptoms, consultation_mode, meet_link)
+        ).fetchone()['id']
+        conn.execute(notification_query, (doctor_id, message_suffix, appointment_id, patient_id))
+    _patient_context_cache.clear()
     
     return appointment_id
 
@@ -379,7 +795,8 @@ def get_patient_appointments(patient_id):
     Get all appointments for a patient with doctor details
     """
     query = """
-        SELECT a.*, 
+        SELECT a.id, a.date, a.time, a.symptoms, a.status, a.consultation_mode,
+               a.meet_link, a.created_at,
                u.full_name as doctor_name, 
                d.specialization, 
                d.consultation_fee,
@@ -390,7 +807,8 @@ def get_patient_appointments(patient_id):
         WHERE a.patient_id = ?
         ORDER BY a.date DESC, a.time DESC
     """
-    return execute_query(query, (patient_id,), fetchall=True)
+    # Only rendered by the template, so the rows are not copied into dicts
+    return execute_query(query, (patient_id,), fetchall=True, as_dict=False)
 
 
 def get_doctor_appointments(doctor_id):
@@ -399,7 +817,9 @@ def get_doctor_appointments(doctor_id):
     Ordered by newest requests first (by created_at)
     """
     query = """
-        SELECT a.*, 
+        SELECT a.id, a.patient_id, a.date, a.time, a.symptoms, a.status,
+               a.consultation_mode, a.meet_link, a.follow_up_required,
+               a.follow_up_date, a.created_at,
                u.full_name as patient_name, 
                u.phone as patient_phone,
                u.gender as patient_gender,
@@ -409,7 +829,8 @@ def get_doctor_appointments(doctor_id):
         WHERE a.doctor_id = ?
         ORDER BY a.created_at DESC
     """
-    return execute_query(query, (doctor_id,), fetchall=True)
+    # Only rendered by the template, so the rows are not copied into dicts
+    return execute_query(query, (doctor_id,), fetchall=True, as_dict=False)
 
 
 def get_doctor_patients(doctor_id):
@@ -417,9 +838,19 @@ def get_doctor_patients(doctor_id):
     Get all unique patients who have had appointments with this doctor
     Returns patient details along with appointment count and last visit
     """
+    # Aggregate the doctor's appointments per patient first, then join the
+    # patient columns once per patient instead of grouping by all of them
     query = """
-        SELECT DISTINCT
-               u.id,
+        WITH visits AS (
+            SELECT patient_id,
+                   COUNT(*) as total_appointments,
+                   MAX(date) as last_visit,
+                   SUM(CASE WHEN status = 'COMPLETED' THEN 1 ELSE 0 END) as completed_appointments
+            FROM appointments
+            WHERE doctor_id = ? AND status IN ('CONFIRMED', 'COMPLETED')
+            GROUP BY patient_id
+        )
+        SELECT u.id,
                u.full_name,
                u.email,
                u.phone,
@@ -429,18 +860,16 @@ def get_doctor_patients(doctor_id):
                p.allergies,
                p.chronic_conditions,
                p.emergency_contact,
-               COUNT(DISTINCT a.id) as total_appointments,
-               MAX(a.date) as last_visit,
-               SUM(CASE WHEN a.status = 'COMPLETED' THEN 1 ELSE 0 END) as completed_appointments
-        FROM users u
+               v.total_appointments,
+               v.last_visit,
+               v.completed_appointments
+        FROM visits v
+        JOIN users u ON u.id = v.patient_id
         JOIN patient_details p ON u.id = p.user_id
-        JOIN appointments a ON u.id = a.patient_id
-        WHERE a.doctor_id = ? AND a.status IN ('CONFIRMED', 'COMPLETED')
-        GROUP BY u.id, u.full_name, u.email, u.phone, u.gender, u.dob, 
-                 p.blood_group, p.allergies, p.chronic_conditions, p.emergency_contact
-        ORDER BY MAX(a.date) DESC
+        ORDER BY v.last_visit DESC
     """
-    return execute_query(query, (doctor_id,), fetchall=True)
+    # Only rendered by the template, so the rows are not copied into dicts
+    return execute_query(query, (doctor_id,), fetchall=True, as_dict=False)
 
 
 def get_appointment_by_id(appointment_id):
@@ -461,71 +890,57 @@ def get_appointment_by_id(appointment_id):
     return execute_query(query, (appointment_id,), fetchone=True)
 
 
-def get_doctor_stats(doctor_id):
+def get_doctor_stats(doctor_id, today_date=None, conn=None):
     """
     Get statistics for doctor dashboard
     Returns: pending appointments, today's appointments, total patients, this month stats
-    """
-    today = get_ist_today().strftime('%Y-%m-%d')
-    
-    # Get current month and year
-    current_month = get_ist_today().strftime('%Y-%m')
-    
-    # Get pending appointments count
-    pending_query = """
-        SELECT COUNT(*) as count
-        FROM appointments
-        WHERE doctor_id = ? AND status = 'PENDING'
-    """
-    pending_result = execute_query(pending_query, (doctor_id,), fetchone=True)
-    pending_count = pending_result['count'] if pending_result else 0
-    
-    # Get today's appointments count (CONFIRMED or COMPLETED)
-    today_query = """
-        SELECT COUNT(*) as count
-        FROM appointments
-        WHERE doctor_id = ? AND date = ? AND status IN ('CONFIRMED', 'COMPLETED')
-    """
-    today_result = execute_query(today_query, (doctor_id, today), fetchone=True)
-    today_count = today_result['count'] if today_result else 0
-    
-    # Get total unique patients count
-    patients_query = """
-        SELECT COUNT(DISTINCT patient_id) as count
-        FROM appointments
-        WHERE doctor_id = ? AND status IN ('CONFIRMED', 'COMPLETED')
-    """
-    patients_result = execute_query(patients_query, (doctor_id,), fetchone=True)
-    patients_count = patients_result['count'] if patients_result else 0
-    
-    # Get this month's appointments count
-    month_appointments_query = """
-        SELECT COUNT(*) as count
-        FROM appointments
-        WHERE doctor_id = ? AND strftime('%Y-%m', date) = ? AND status IN ('CONFIRMED', 'COMPLETED')
-    """
-    month_appt_result = execute_query(month_appointments_query, (doctor_id, current_month), fetchone=True)
-    month_appointments = month_appt_result['count'] if month_appt_result else 0
-    
-    # Get this month's revenue
-    month_revenue_query = """
-        SELECT SUM(dd.consultation_fee) as revenue
-        FROM appointments a
-        JOIN doctor_details dd ON a.doctor_id = dd.user_id
-        WHERE a.doctor_id = ? AND strftime('%Y-%m', a.date) = ? AND a.status IN ('CONFIRMED', 'COMPLETED')
-    """
-    month_revenue_result = execute_query(month_revenue_query, (doctor_id, current_month), fetchone=True)
-    month_revenue = month_revenue_result['revenue'] if month_revenue_result and month_revenue_result['revenue'] else 0
+    today_date: IST date to report on; pass it when the caller already has it
+    conn: Connection to query on (optional)
+    """
+    if today_date is None:
+        today_date = get_ist_today()
+    today = today_date.isoformat()
+    
+    # Current month as a [start, end) date range: plain string comparisons on
+    # each of the doctor's appointments instead of strftime() on every row
+    month_start = today_date.replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    
+    # All dashboard numbers in one pass over the doctor's appointments.
+    # The aggregate subquery always yields one row, even without appointments.
+    stats_query = """
+        SELECT s.pending_count,
+               s.today_count,
+               s.patients_count,
+               s.month_appointments,
+               s.month_appointments * dd.consultation_fee as month_revenue,
+               dd.user_id IS NOT NULL as has_details,
+               dd.average_rating,
+               dd.total_ratings
+        FROM (
+            SELECT COUNT(CASE WHEN status = 'PENDING' THEN 1 END) as pending_count,
+                   COUNT(CASE WHEN date = ? AND status IN ('CONFIRMED', 'COMPLETED') THEN 1 END) as today_count,
+                   COUNT(DISTINCT CASE WHEN status IN ('CONFIRMED', 'COMPLETED') THEN patient_id END) as patients_count,
+                   COUNT(CASE WHEN date >= ? AND date < ? AND status IN ('CONFIRMED', 'COMPLETED') THEN 1 END) as month_appointments
+            FROM appointments
+            WHERE doctor_id = ?
+        ) s
+        LEFT JOIN doctor_details dd ON dd.user_id = ?
+    """
+    stats = execute_query(
+        stats_query,
+        (today, month_start.isoformat(), next_month_start.isoformat(), doctor_id, doctor_id),
+        fetchone=True,
+        conn=conn
+    )
     
-    # Get average rating
-    rating_query = """
-        SELECT average_rating, total_ratings
-        FROM doctor_details
-        WHERE user_id = ?
-    """
-    rating_result = execute_query(rating_query, (doctor_id,), fetchone=True)
-    avg_rating = rating_result['average_rating'] if rating_result else 0
-    total_ratings = rating_result['total_ratings'] if rating_result else 0
+    pending_count = stats['pending_count']
+    today_count = stats['today_count']
+    patients_count = stats['patients_count']
+    month_appointments = stats['month_appointments']
+    month_revenue = stats['month_revenue'] or 0
+    avg_rating = stats['average_rating'] if stats['has_details'] else 0
+    total_ratings = stats['total_ratings'] if stats['has_details'] else 0
     
     return {
         'pending_appointments': pending_count,
@@ -538,11 +953,13 @@ def get_doctor_stats(doctor_id):
     }
 
 
-def get_doctor_today_appointments(doctor_id):
+def get_doctor_today_appointments(doctor_id, today_date=None, conn=None):
     """
     Get today's appointments for doctor dashboard widget
+    today_date: IST date to list; pass it when the caller already has it
+    conn: Connection to query on (optional)
     """
-    today = get_ist_today().strftime('%Y-%m-%d')
+    today = (today_date or get_ist_today()).isoformat()
     
     query = """
         SELECT a.*, 
@@ -553,7 +970,29 @@ def get_doctor_today_appointments(doctor_id):
         WHERE a.doctor_id = ? AND a.date = ? AND a.status IN ('CONFIRMED', 'COMPLETED')
         ORDER BY a.time ASC
     """
-    return execute_query(query, (doctor_id, today), fetchall=True)
+    # Only rendered by the template, so the rows are not copied into dicts
+    return execute_query(query, (doctor_id, today), fetchall=True, as_dict=False, conn=conn)
+
+
+def get_doctor_dashboard_bundle(doctor_id, today_date=None):
+    """
+    Everything the doctor dashboard renders, read over one pooled connection
+    
+    Args:
+        doctor_id: ID of the doctor
+        today_date: IST date to report on (defaults to today)
+    
+    Returns:
+        dict with stats and today_appointments
+    """
+    if today_date is None:
+        today_date = get_ist_today()
+    
+    with _pool.acquire() as conn:
+        return {
+            'stats': get_doctor_stats(doctor_id, today_date, conn=conn),
+            'today_appointments': get_doctor_today_appointments(doctor_id, today_date, conn=conn)
+        }
 
 
 def update_appointment_status(appointment_id, status):
@@ -565,7 +1004,9 @@ def update_appointment_status(appointment_id, status):
         SET status = ?
         WHERE id = ?
     """
-    return execute_query(query, (status, appointment_id), commit=True)
+    result = execute_query(query, (status, appointment_id), commit=True)
+    _patient_context_cache.clear()
+    return result
 
 
 def cancel_appointment(appointment_id):
@@ -573,7 +1014,9 @@ def cancel_appointment(appointment_id):
     Delete/cancel an appointment
     """
     query = "DELETE FROM appointments WHERE id = ?"
-    return execute_query(query, (appointment_id,), commit=True)
+    result = execute_query(query, (appointment_id,), commit=True)
+    _patient_context_cache.clear()
+    return result
 
 
 def mark_follow_up_required(appointment_id, follow_up_date, doctor_id, patient_id):
@@ -586,17 +1029,20 @@ def mark_follow_up_required(appointment_id, follow_up_date, doctor_id, patient_i
         SET follow_up_required = 1, follow_up_date = ?
         WHERE id = ?
     """
-    execute_query(query, (follow_up_date, appointment_id), commit=True)
-    
-    # Create notification for patient
     message = f"Your doctor recommends a follow-up visit on {follow_up_date}"
-    create_notification(
-        user_id=patient_id,
-        notification_type='FOLLOW_UP_REQUIRED',
-        message=message,
-        link='/patient/appointments',
-        appointment_id=appointment_id
-    )
+    
+    with transaction() as conn:
+        conn.execute(query, (follow_up_date, appointment_id))
+        
+        # Create notification for patient
+        create_notification(
+            user_id=patient_id,
+            notification_type='FOLLOW_UP_REQUIRED',
+            message=message,
+            link='/patient/appointments',
+            appointment_id=appointment_id,
+            conn=conn
+        )
     
     return True
 
@@ -609,7 +1055,9 @@ def create_follow_up_appointment(parent_appointment_id, patient_id, doctor_id, d
         INSERT INTO appointments (patient_id, doctor_id, date, time, status, parent_appointment_id)
         VALUES (?, ?, ?, ?, 'PENDING', ?)
     """
-    return execute_query(query, (patient_id, doctor_id, date, time, parent_appointment_id), commit=True)
+    result = execute_query(query, (patient_id, doctor_id, date, time, parent_appointment_id), commit=True)
+    _patient_context_cache.clear()
+    return result
 
 
 def get_follow_up_recommendations(patient_id):
@@ -624,13 +1072,12 @@ def get_follow_up_recommendations(patient_id):
         FROM appointments a
         JOIN users u ON a.doctor_id = u.id
         LEFT JOIN doctor_details dd ON a.doctor_id = dd.user_id
+        -- Anti-join on idx_appointment_parent: keep rows with no follow-up booked
+        LEFT JOIN appointments f ON f.parent_appointment_id = a.id
         WHERE a.patient_id = ? 
         AND a.follow_up_required = 1
         AND a.status = 'COMPLETED'
-        AND NOT EXISTS (
-            SELECT 1 FROM appointments f 
-            WHERE f.parent_appointment_id = a.id
-        )
+        AND f.id IS NULL
         ORDER BY a.follow_up_date ASC
     """
     return execute_query(query, (patient_id,), fetchall=True)
@@ -688,7 +1135,9 @@ def create_prescription(doctor_id, patient_id, appointment_id, diagnosis, medici
         INSERT INTO prescriptions (doctor_id, patient_id, appointment_id, diagnosis, medicines_json, notes)
         VALUES (?, ?, ?, ?, ?, ?)
     """
-    return execute_query(query, (doctor_id, patient_id, appointment_id, diagnosis, medicines_json, notes), commit=True)
+    result = execute_query(query, (doctor_id, patient_id, appointment_id, diagnosis, medicines_json, notes), commit=True)
+    _patient_context_cache.clear()
+    return result
 
 
 def get_patient_prescriptions(patient_id):
@@ -760,7 +1209,7 @@ def get_patient_uploaded_prescriptions(patient_id):
     Get all uploaded prescriptions for a patient
     """
     query = """
-        SELECT *
+        SELECT id, filename, extracted_data, uploaded_at
         FROM uploads
         WHERE patient_id = ? AND upload_type = 'PRESCRIPTION'
         ORDER BY uploaded_at DESC
@@ -780,7 +1229,8 @@ def delete_uploaded_prescription(upload_id):
 # 📬 Notification Functions
 # --------------------------------------------------
 
-def create_notification(user_id, notification_type, message, link=None, appointment_id=None, prescription_id=None):
+def create_notification(user_id, notification_type, message, link=None, appointment_id=None, prescription_id=None,
+                        conn=None):
     """
     Create a notification for a user
     
@@ -791,6 +1241,7 @@ def create_notification(user_id, notification_type, message, link=None, appointm
         link: URL to navigate when clicked (optional for rejected appointments)
         appointment_id: Related appointment ID (optional)
         prescription_id: Related prescription ID (optional)
+        conn: Connection of an open transaction() to write in (optional)
     
     Returns:
         Notification ID if successful, None otherwise
@@ -799,12 +1250,16 @@ def create_notification(user_id, notification_type, message, link=None, appointm
         INSERT INTO notifications (user_id, type, message, link, appointment_id, prescription_id)
         VALUES (?, ?, ?, ?, ?, ?)
     """
-    return execute_query(query, (user_id, notification_type, message, link, appointment_id, prescription_id), commit=True)
+    params = (user_id, notification_type, message, link, appointment_id, prescription_id)
+    if conn is not None:
+        return conn.execute(query, params).lastrowid
+    return execute_query(query, params, commit=True)
 
 
 def get_user_notifications(user_id, unread_only=False):
     """
-    Get all notifications for a user (with automatic cleanup of old read notifications)
+    Get all notifications for a user
+    Old read notifications are removed by cleanup_read_notifications() on a schedule
     
     Args:
         user_id: ID of the user
@@ -813,24 +1268,18 @@ def get_user_notifications(user_id, unread_only=False):
     Returns:
         List of notification dictionaries
     """
-    # Clean up old read notifications (older than 7 days)
-    cleanup_query = """
-        DELETE FROM notifications
-        WHERE user_id = ? AND is_read = 1 
-        AND datetime(created_at) < datetime('now', '-7 days')
-    """
-    execute_query(cleanup_query, (user_id,), commit=True)
-    
     if unread_only:
         query = """
-            SELECT * FROM notifications
+            SELECT id, type, message, link, is_read, appointment_id, prescription_id, created_at
+            FROM notifications
             WHERE user_id = ? AND is_read = 0
             ORDER BY created_at DESC
             LIMIT 50
         """
     else:
         query = """
-            SELECT * FROM notifications
+            SELECT id, type, message, link, is_read, appointment_id, prescription_id, created_at
+            FROM notifications
             WHERE user_id = ?
             ORDER BY created_at DESC
             LIMIT 50
@@ -903,14 +1352,32 @@ def cleanup_old_notifications():
     Returns:
         Number of deleted notifications
     """
+    # created_at is stored in the same 'YYYY-MM-DD HH:MM:SS' form datetime() returns,
+    # so it is compared directly and the range can use idx_notification_created
     query = """
         DELETE FROM notifications
-        WHERE datetime(created_at) < datetime('now', '-30 days')
+        WHERE created_at < datetime('now', '-30 days')
     """
     execute_query(query, (), commit=True)
     return True
 
 
+def cleanup_read_notifications(days=7):
+    """
+    Global cleanup function - delete read notifications older than `days` days
+    Runs hourly from the scheduler, keeping the delete off the notification read path
+    
+    Returns:
+        True if successful
+    """
+    query = """
+        DELETE FROM notifications
+        WHERE created_at < datetime('now', ?) AND is_read = 1
+    """
+    execute_query(query, (f'-{int(days)} days',), commit=True)
+    return True
+
+
 # ========================================
 # 🌟 DOCTOR RATING FUNCTIONS
 # ========================================
@@ -930,42 +1397,102 @@ def create_rating(doctor_id, patient_id, appointment_id, rating, review_text=Non
         Rating ID
     """
     query = """
-        INSERT INTO doctor_ratings (doctor_id, patient_id, appointment_id, rating, review_text)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO doctor_ratings (doctor_id, patient_id, appointment_id, rating, review_text, patient_name)
+        VALUES (?, ?, ?, ?, ?, (SELECT full_name FROM users WHERE id = ?))
+        RETURNING id
     """
-    rating_id = execute_query(query, (doctor_id, patient_id, appointment_id, rating, review_text), commit=True)
-    
-    # Update doctor's average rating
-    update_doctor_average_rating(doctor_id)
+    # trg_rating_ai folds the rating into doctor_details in the same transaction
+    rating_id = execute_query(query, (doctor_id, patient_id, appointment_id, rating, review_text, patient_id),
+                              returning=True)
+    _invalidate_doctor_rating(doctor_id)
     
     return rating_id
 
 
-def update_doctor_average_rating(doctor_id):
+def create_rating_if_absent(doctor_id, patient_id, appointment_id, rating, review_text=None):
     """
-    Recalculate and update doctor's average rating
+    Create a rating unless the patient already rated this appointment.
+    The existence check and the insert are one statement, so two submissions
+    of the same form cannot both get in between check and insert.
     
     Args:
-        doctor_id: ID of the doctor
+        doctor_id: ID of the doctor being rated
+        patient_id: ID of the patient giving the rating
+        appointment_id: ID of the completed appointment
+        rating: Rating value (1-5)
+        review_text: Optional review text
+    
+    Returns:
+        Rating ID, or None if the appointment was already rated
     """
-    # Calculate average
     query = """
-        SELECT AVG(rating) as avg_rating, COUNT(*) as total_ratings
-        FROM doctor_ratings
-        WHERE doctor_id = ?
+        INSERT INTO doctor_ratings (doctor_id, patient_id, appointment_id, rating, review_text, patient_name)
+        SELECT ?, ?, ?, ?, ?, (SELECT full_name FROM users WHERE id = ?)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM doctor_ratings
+            WHERE patient_id = ? AND appointment_id = ?
+        )
+        RETURNING id
     """
-    result = execute_query(query, (doctor_id,), fetchone=True)
+    # No row comes back when nothing was inserted
+    rating_id = execute_query(query, (doctor_id, patient_id, appointment_id, rating, review_text, patient_id,
+                                      patient_id, appointment_id), returning=True)
+    if rating_id is None:
+        return None
+    _invalidate_doctor_rating(doctor_id)
     
-    avg_rating = result['avg_rating'] if result['avg_rating'] else 0.0
-    total_ratings = result['total_ratings'] if result['total_ratings'] else 0
+    return rating_id
+
+
+def _invalidate_doctor_rating(doctor_id):
+    """Drop every cached row that shows this doctor's rating"""
+    _doctor_details_cache.pop(doctor_id)
+    _doctor_rating_cache.pop(doctor_id)
+    _doctor_search_cache.clear()
+    _doctor_list_cache.clear()
+
+
+def refresh_doctor_averages(force=False):
+    """
+    Recompute every doctor's average_rating and total_ratings from doctor_ratings.
+    The doctor_ratings triggers keep them current on each write; this runs
+    periodically from the scheduler to reconcile any drift, e.g. float
+    rounding from the incremental updates or ratings edited outside the app.
+    
+    Args:
+        force: Rewrite every doctor's figures, not only those that differ
     
-    # Update doctor_details
-    update_query = """
+    Returns:
+        Number of doctors updated
+    """
+    query = """
         UPDATE doctor_details
-        SET average_rating = ?, total_ratings = ?
-        WHERE user_id = ?
+        SET average_rating = agg.average_rating, total_ratings = agg.total_ratings
+        FROM (
+            SELECT d.user_id,
+                   COALESCE(AVG(r.rating), 0.0) AS average_rating,
+                   COUNT(r.id) AS total_ratings
+            FROM doctor_details d
+            LEFT JOIN doctor_ratings r ON r.doctor_id = d.user_id
+            GROUP BY d.user_id
+        ) AS agg
+        WHERE doctor_details.user_id = agg.user_id
+        AND (
+            ?
+            OR doctor_details.total_ratings IS NOT agg.total_ratings
+            OR abs(COALESCE(doctor_details.average_rating, 0.0) - agg.average_rating) > 1e-9
+        )
     """
-    execute_query(update_query, (avg_rating, total_ratings, doctor_id), commit=True)
+    with transaction() as conn:
+        updated = conn.execute(query, (1 if force else 0,)).rowcount
+    
+    if updated:
+        # Which doctors changed is not known here; a reconcile is rare
+        _doctor_details_cache.clear()
+        _doctor_rating_cache.clear()
+        _doctor_search_cache.clear()
+        _doctor_list_cache.clear()
+    return updated
 
 
 def get_doctor_ratings(doctor_id, limit=10):
@@ -977,22 +1504,17 @@ def get_doctor_ratings(doctor_id, limit=10):
         limit: Maximum number of ratings to return
     
     Returns:
-        List of rating dictionaries
+        List of read-only sqlite3.Row ratings
     """
+    # patient_name is copied into doctor_ratings on insert and kept current on rename
     query = """
-        SELECT 
-            dr.id,
-            dr.rating,
-            dr.review_text,
-            dr.created_at,
-            u.full_name as patient_name
-        FROM doctor_ratings dr
-        JOIN users u ON dr.patient_id = u.id
-        WHERE dr.doctor_id = ?
-        ORDER BY dr.created_at DESC
+        SELECT id, rating, review_text, created_at, patient_name
+        FROM doctor_ratings
+        WHERE doctor_id = ?
+        ORDER BY created_at DESC
         LIMIT ?
     """
-    return execute_query(query, (doctor_id, limit), fetchall=True)
+    return execute_query(query, (doctor_id, limit), fetchall=True, as_dict=False)
 
 
 def check_existing_rating(patient_id, appointment_id):
@@ -1023,89 +1545,163 @@ def get_doctor_average_rating(doctor_id):
     Returns:
         Dict with average_rating and total_ratings
     """
+    cached = _doctor_rating_cache.get(doctor_id)
+    if cached is not _MISSING:
+        return cached
+    
+    # user_id is unique, so MAX() is just the doctor's value; an aggregate
+    # always returns one row, and COALESCE covers a missing doctor or NULLs
     query = """
-        SELECT average_rating, total_ratings
+        SELECT COALESCE(MAX(average_rating), 0.0) AS average_rating,
+               COALESCE(MAX(total_ratings), 0) AS total_ratings
         FROM doctor_details
         WHERE user_id = ?
     """
-    result = execute_query(query, (doctor_id,), fetchone=True)
-    
-    if result:
-        return {
-            'average_rating': result['average_rating'] or 0.0,
-            'total_ratings': result['total_ratings'] or 0
-        }
-    return {'average_rating': 0.0, 'total_ratings': 0}
+    rating = execute_query(query, (doctor_id,), fetchone=True)
+    _doctor_rating_cache.set(doctor_id, rating)
+    return rating
 
 
 # ============================================================================
 # SEARCH FUNCTIONS
 # ============================================================================
 
-def search_doctors(query):
+# The trigram index can only look up substrings this long or longer
+FTS_MIN_QUERY_LENGTH = 3
+
+
+def _fts_phrase(query):
     """
-    Search doctors by name, specialization, or qualification
-    Returns list of doctors matching the search query
+    Quote a search box query as an FTS5 phrase, which a trigram index matches
+    as a case-insensitive substring. None if it is too short to look up.
     """
-    search_pattern = f"%{query}%"
-    sql = """
-        SELECT u.*, d.specialization, d.qualification, d.experience_years, d.consultation_fee,
-               d.average_rating, d.total_ratings
-        FROM users u
-        JOIN doctor_details d ON u.id = d.user_id
-        WHERE u.role = 'DOCTOR'
-        AND (
-            u.full_name LIKE ? COLLATE NOCASE
-            OR d.specialization LIKE ? COLLATE NOCASE
-            OR d.qualification LIKE ? COLLATE NOCASE
-        )
-        ORDER BY d.average_rating DESC, u.full_name
+    if len(query) < FTS_MIN_QUERY_LENGTH:
+        return None
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _like_pattern(query):
+    """
+    Substring LIKE pattern for a search box query. '%' and '_' are escaped so
+    they match literally, as they do in the FTS phrase.
+    """
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+# Search predicates: an FTS lookup, or LIKE scans for queries too short for it
+_DOCTOR_FTS_MATCH = "user_id IN (SELECT rowid FROM doctors_fts WHERE doctors_fts MATCH ?)"
+# The materialized table holds lowercased copies of the searched columns
+_DOCTOR_LIKE_MATCH = r"""(
+                name_lower LIKE ? ESCAPE '\'
+                OR spec_lower LIKE ? ESCAPE '\'
+                OR qual_lower LIKE ? ESCAPE '\'
+            )"""
+_PATIENT_FTS_MATCH = "u.id IN (SELECT rowid FROM patients_fts WHERE patients_fts MATCH ?)"
+_PATIENT_LIKE_MATCH = r"""(
+                u.full_name LIKE ? COLLATE NOCASE ESCAPE '\'
+                OR u.email LIKE ? COLLATE NOCASE ESCAPE '\'
+                OR u.phone LIKE ? COLLATE NOCASE ESCAPE '\'
+            )"""
+
+# Indexed in result order, so no join or sort happens per keystroke
+_SEARCH_DOCTORS_SQL = """
+        SELECT user_id AS id, full_name, specialization, qualification, experience_years,
+               consultation_fee, average_rating, total_ratings
+        FROM mv_doctor_search
+        WHERE {match}
+        ORDER BY average_rating DESC, full_name
         LIMIT 20
     """
-    return execute_query(sql, (search_pattern, search_pattern, search_pattern), fetchall=True)
-
 
-def search_patients(query, doctor_id=None):
-    """
-    Search patients by name, email, or phone
-    Optionally filter by doctor's patients only
-    """
-    search_pattern = f"%{query}%"
-    
-    if doctor_id:
-        # Search only patients who have appointments with this doctor
-        sql = """
-            SELECT DISTINCT u.*, p.blood_group
+# Search only patients who have appointments with this doctor. EXISTS stops
+# at the first appointment instead of joining them all and de-duplicating.
+_SEARCH_DOCTOR_PATIENTS_SQL = """
+            SELECT u.*, p.blood_group
             FROM users u
             LEFT JOIN patient_details p ON u.id = p.user_id
-            INNER JOIN appointments a ON u.id = a.patient_id
             WHERE u.role = 'PATIENT'
-            AND a.doctor_id = ?
-            AND (
-                u.full_name LIKE ? COLLATE NOCASE
-                OR u.email LIKE ? COLLATE NOCASE
-                OR u.phone LIKE ? COLLATE NOCASE
+            AND EXISTS (
+                SELECT 1 FROM appointments a
+                WHERE a.patient_id = u.id AND a.doctor_id = ?
             )
+            AND {match}
             ORDER BY u.full_name
             LIMIT 20
         """
-        return execute_query(sql, (doctor_id, search_pattern, search_pattern, search_pattern), fetchall=True)
-    else:
-        # Search all patients (admin functionality)
-        sql = """
+
+# Search all patients (admin functionality)
+_SEARCH_ALL_PATIENTS_SQL = """
             SELECT u.*, p.blood_group
             FROM users u
             LEFT JOIN patient_details p ON u.id = p.user_id
             WHERE u.role = 'PATIENT'
-            AND (
-                u.full_name LIKE ? COLLATE NOCASE
-                OR u.email LIKE ? COLLATE NOCASE
-                OR u.phone LIKE ? COLLATE NOCASE
-            )
+            AND {match}
             ORDER BY u.full_name
             LIMIT 20
         """
-        return execute_query(sql, (search_pattern, search_pattern, search_pattern), fetchall=True)
+
+# Every search statement is formatted once here, keyed by whether it uses
+# the FTS index, so a search neither rebuilds SQL text nor misses the
+# connection's prepared-statement cache
+_SEARCH_SQL = {
+    'doctors': {
+        True: _SEARCH_DOCTORS_SQL.format(match=_DOCTOR_FTS_MATCH),
+        False: _SEARCH_DOCTORS_SQL.format(match=_DOCTOR_LIKE_MATCH),
+    },
+    'doctor_patients': {
+        True: _SEARCH_DOCTOR_PATIENTS_SQL.format(match=_PATIENT_FTS_MATCH),
+        False: _SEARCH_DOCTOR_PATIENTS_SQL.format(match=_PATIENT_LIKE_MATCH),
+    },
+    'all_patients': {
+        True: _SEARCH_ALL_PATIENTS_SQL.format(match=_PATIENT_FTS_MATCH),
+        False: _SEARCH_ALL_PATIENTS_SQL.format(match=_PATIENT_LIKE_MATCH),
+    },
+}
+
+
+def search_doctors(query):
+    """
+    Search doctors by name, specialization, or qualification
+    Returns list of doctors matching the search query
+    """
+    # Live search repeats the same prefixes as users type and retype
+    results = _doctor_search_cache.get(query)
+    if results is not _MISSING:
+        return results
+    
+    phrase = _fts_phrase(query)
+    if phrase:
+        params = (phrase,)
+    else:
+        search_pattern = _like_pattern(query.lower())
+        params = (search_pattern, search_pattern, search_pattern)
+    
+    # Rows are only read by key, and being read-only they are safe to share from the cache
+    results = execute_query(_SEARCH_SQL['doctors'][phrase is not None], params, fetchall=True, as_dict=False)
+    _doctor_search_cache.set(query, results)
+    return results
+
+
+def search_patients(query, doctor_id=None):
+    """
+    Search patients by name, email, or phone
+    Optionally filter by doctor's patients only
+    """
+    phrase = _fts_phrase(query)
+    if phrase:
+        params = (phrase,)
+    else:
+        search_pattern = _like_pattern(query)
+        params = (search_pattern, search_pattern, search_pattern)
+    use_fts = phrase is not None
+    
+    if doctor_id:
+        sql, params = _SEARCH_SQL['doctor_patients'][use_fts], (doctor_id,) + params
+    else:
+        sql = _SEARCH_SQL['all_patients'][use_fts]
+    
+    return execute_query(sql, params, fetchall=True, as_dict=False)
 
 
 # ============================================================================
@@ -1133,25 +1729,33 @@ def get_patient_lab_reports(patient_id, test_type=None):
     """
     if test_type:
         query = """
-            SELECT * FROM lab_reports
+            SELECT id, patient_id, test_type, test_date, report_image,
+                   extracted_values_json, notes, uploaded_at
+            FROM lab_reports
             WHERE patient_id = ? AND test_type = ?
             ORDER BY test_date DESC, uploaded_at DESC
         """
-        return execute_query(query, (patient_id, test_type), fetchall=True)
+        return execute_query(query, (patient_id, test_type), fetchall=True, as_dict=False)
     else:
         query = """
-            SELECT * FROM lab_reports
+            SELECT id, patient_id, test_type, test_date, report_image,
+                   extracted_values_json, notes, uploaded_at
+            FROM lab_reports
             WHERE patient_id = ?
             ORDER BY test_date DESC, uploaded_at DESC
         """
-        return execute_query(query, (patient_id,), fetchall=True)
+        return execute_query(query, (patient_id,), fetchall=True, as_dict=False)
 
 
 def get_lab_report_by_id(report_id):
     """
-    Get a specific lab report by ID
+    Get a specific lab report by ID, without its extracted values
+    """
+    query = """
+        SELECT id, patient_id, test_type, test_date, report_image, notes, uploaded_at
+        FROM lab_reports
+        WHERE id = ?
     """
-    query = "SELECT * FROM lab_reports WHERE id = ?"
     return execute_query(query, (report_id,), fetchone=True)
 
 
@@ -1168,139 +1772,147 @@ def get_lab_report_trends(patient_id, test_type, parameter_name, limit=10):
     Get trend data for a specific health parameter over time
     Returns list of {test_date, value} for charting
     """
+    # JSON1 pulls the one value out in C and drops reports without it, so
+    # LIMIT counts only reports that have the parameter. json_each matches
+    # the key exactly, with none of json_extract's path quoting rules.
     query = """
-        SELECT test_date, extracted_values_json
-        FROM lab_reports
-        WHERE patient_id = ? AND test_type = ?
-        ORDER BY test_date ASC
+        SELECT r.test_date, v.value, v.type
+        FROM lab_reports r, json_each(r.extracted_values_json) v
+        WHERE r.patient_id = ? AND r.test_type = ? AND v.key = ?
+        ORDER BY r.test_date ASC
         LIMIT ?
     """
-    reports = execute_query(query, (patient_id, test_type, limit), fetchall=True)
-    
-    trends = []
-    for report in reports:
-        if report['extracted_values_json']:
-            import json
-            values = json.loads(report['extracted_values_json'])
-            if parameter_name in values:
-                trends.append({
-                    'date': report['test_date'],
-                    'value': values[parameter_name]
-                })
-    
-    return trends
+    rows = execute_query(query, (patient_id, test_type, parameter_name, limit), fetchall=True, as_dict=False)
+    
+    return [{'date': row['test_date'], 'value': _json_each_value(row)} for row in rows]
+
+
+def _json_each_value(row):
+    """The Python value json.loads would give for a json_each() row's value/type"""
+    if row['type'] == 'true':
+        return True
+    if row['type'] == 'false':
+        return False
+    if row['type'] in ('object', 'array'):
+        return _parse_json(row['value'])
+    return row['value']
+
+
+@dataclass
+class HistoryEvent:
+    """One entry of the patient history timeline"""
+    # Declared by hand: dataclass(slots=True) needs Python 3.10
+    __slots__ = ('type', 'date', 'time', 'title', 'status', 'details')
+    
+    type: str
+    date: str
+    time: str
+    title: str
+    status: str
+    details: dict
+
+
+# Appointments, prescriptions and lab reports in one statement, padded to
+# a common shape and ordered as the timeline shows them: newest date
+# first, then appointments, prescriptions and lab reports on the same day
+_PATIENT_HISTORY_SQL = """
+    SELECT 'appointment' AS type, 0 AS type_order,
+           a.date, a.time, a.status, NULL AS created_at,
+           u.full_name AS doctor_name, dd.specialization, a.symptoms, dd.consultation_fee,
+           NULL AS diagnosis, NULL AS medicine_count,
+           NULL AS test_type, NULL AS notes, NULL AS extracted_values_json
+    FROM appointments a
+    JOIN users u ON a.doctor_id = u.id
+    LEFT JOIN doctor_details dd ON a.doctor_id = dd.user_id
+    WHERE a.patient_id = ?1
+    UNION ALL
+    SELECT 'prescription', 1,
+           substr(p.created_at, 1, 10), substr(p.created_at, 12, 5), NULL, p.created_at,
+           u.full_name, dd.specialization, NULL, NULL,
+           p.diagnosis,
+           CASE WHEN json_valid(p.medicines_json) THEN json_array_length(p.medicines_json) ELSE 0 END,
+           NULL, NULL, NULL
+    FROM prescriptions p
+    JOIN users u ON p.doctor_id = u.id
+    LEFT JOIN doctor_details dd ON p.doctor_id = dd.user_id
+    WHERE p.patient_id = ?1
+    UNION ALL
+    SELECT 'lab_report', 2,
+           test_date, NULL, NULL, NULL,
+           NULL, NULL, NULL, NULL,
+           NULL, NULL,
+           test_type, notes, extracted_values_json
+    FROM lab_reports
+    WHERE patient_id = ?1
+    ORDER BY date DESC, type_order, created_at DESC
+"""
 
 
 def get_patient_history(patient_id):
     """
     Get complete patient history timeline: appointments, prescriptions, and lab reports
-    Returns combined data sorted by date
-    """
-    history = []
-    
-    # Get appointments
-    appointments_query = """
-        SELECT 
-            a.id, a.date, a.time, a.status, a.symptoms,
-            u.full_name as doctor_name,
-            dd.specialization, dd.consultation_fee
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        LEFT JOIN doctor_details dd ON a.doctor_id = dd.user_id
-        WHERE a.patient_id = ?
-        ORDER BY a.date DESC
-    """
-    appointments = execute_query(appointments_query, (patient_id,), fetchall=True)
-    
-    for apt in appointments:
-        history.append({
-            'type': 'appointment',
-            'date': apt['date'],
-            'time': apt.get('time', ''),
-            'title': f"Appointment with Dr. {apt['doctor_name']}",
-            'status': apt['status'],
-            'details': {
-                'specialization': apt['specialization'],
-                'symptoms': apt['symptoms'],
-                'consultation_fee': apt.get('consultation_fee')
-            }
-        })
-    
-    # Get prescriptions
-    prescriptions_query = """
-        SELECT 
-            p.id, p.created_at, p.diagnosis, p.medicines_json,
-            u.full_name as doctor_name,
-            dd.specialization
-        FROM prescriptions p
-        JOIN users u ON p.doctor_id = u.id
-        LEFT JOIN doctor_details dd ON p.doctor_id = dd.user_id
-        WHERE p.patient_id = ?
-        ORDER BY p.created_at DESC
-    """
-    prescriptions = execute_query(prescriptions_query, (patient_id,), fetchall=True)
-    
-    for presc in prescriptions:
-        # Count medicines
-        medicine_count = 0
-        if presc['medicines_json']:
-            try:
-                import json
-                medicines = json.loads(presc['medicines_json'])
-                medicine_count = len(medicines)
-            except:
-                pass
+    Returns a list of HistoryEvent sorted by date
+    """
+    return list(iter_patient_history(patient_id))
+
+
+def iter_patient_history(patient_id):
+    """
+    Yield the patient history timeline one HistoryEvent at a time, newest first,
+    without building the whole list. Holds a pooled connection until exhausted
+    or closed.
+    """
+    for row in execute_query_iter(_PATIENT_HISTORY_SQL, (patient_id,)):
+        if row['type'] == 'appointment':
+            yield HistoryEvent(
+                type='appointment',
+                date=row['date'],
+                time=row['time'] or '',
+                title=f"Appointment with Dr. {row['doctor_name']}",
+                status=row['status'],
+                details={
+                    'specialization': row['specialization'],
+                    'symptoms': row['symptoms'],
+                    'consultation_fee': row['consultation_fee']
+                }
+            )
         
-        history.append({
-            'type': 'prescription',
-            'date': presc['created_at'][:10],
-            'time': presc['created_at'][11:16] if len(presc['created_at']) > 10 else '',
-            'title': f"Prescription from Dr. {presc['doctor_name']}",
-            'status': 'completed',
-            'details': {
-                'specialization': presc['specialization'],
-                'diagnosis': presc['diagnosis'],
-                'medicine_count': medicine_count
-            }
-        })
-    
-    # Get lab reports
-    lab_reports_query = """
-        SELECT id, test_type, test_date, notes, extracted_values_json
-        FROM lab_reports
-        WHERE patient_id = ?
-        ORDER BY test_date DESC
-    """
-    lab_reports = execute_query(lab_reports_query, (patient_id,), fetchall=True)
-    
-    for report in lab_reports:
-        # Get key extracted values
-        key_values = {}
-        if report['extracted_values_json']:
-            try:
-                import json
-                all_values = json.loads(report['extracted_values_json'])
-                # Get first 3 values for display
-                key_values = dict(list(all_values.items())[:3])
-            except:
-                pass
+        elif row['type'] == 'prescription':
+            yield HistoryEvent(
+                type='prescription',
+                date=row['date'],
+                time=row['time'],
+                title=f"Prescription from Dr. {row['doctor_name']}",
+                status='completed',
+                details={
+                    'specialization': row['specialization'],
+                    'diagnosis': row['diagnosis'],
+                    'medicine_count': row['medicine_count']
+                }
+            )
         
-        history.append({
-            'type': 'lab_report',
-            'date': report['test_date'],
-            'time': '',
-            'title': f"{report['test_type']} Test",
-            'status': 'completed',
-            'details': {
-                'notes': report['notes'],
-                'key_values': key_values
-            }
-        })
-    
-    # Sort all history by date (most recent first)
-    history.sort(key=lambda x: x['date'], reverse=True)
-    
-    return history
+        else:
+            # Get key extracted values
+            key_values = {}
+            if row['extracted_values_json']:
+                try:
+                    all_values = _parse_json(row['extracted_values_json'])
+                    # Get first 3 values for display
+                    key_values = dict(list(all_values.items())[:3])
+                except:
+                    pass
+            
+            yield HistoryEvent(
+                type='lab_report',
+                date=row['date'],
+                time='',
+                title=f"{row['test_type']} Test",
+                status='completed',
+                details={
+                    'notes': row['notes'],
+                    'key_values': key_values
+                }
+            )
 
 
 # ==================== VITAL SIGNS ====================
@@ -1311,13 +1923,16 @@ def create_vital_sign(patient_id, vital_type, value, unit, recorded_by=None, not
     vital_type: 'blood_pressure', 'blood_sugar', 'weight', 'temperature'
     value: string (e.g., "120/80" for BP, "95" for sugar)
     """
-    recorded_at = get_ist_now().strftime('%Y-%m-%d %H:%M:%S')
+    # Naive IST wall-clock time, 'YYYY-MM-DD HH:MM:SS'
+    recorded_at = get_ist_now().replace(tzinfo=None).isoformat(' ', 'seconds')
     
     query = """
         INSERT INTO vital_signs (patient_id, vital_type, value, unit, recorded_at, recorded_by, notes)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """
-    return execute_query(query, (patient_id, vital_type, value, unit, recorded_at, recorded_by, notes), commit=True)
+    result = execute_query(query, (patient_id, vital_type, value, unit, recorded_at, recorded_by, notes), commit=True)
+    _patient_context_cache.clear()
+    return result
 
 
 def get_patient_vitals(patient_id, vital_type=None, days=30):
@@ -1326,26 +1941,62 @@ def get_patient_vitals(patient_id, vital_type=None, days=30):
     If vital_type is None, returns all vitals
     days: number of days to look back
     """
-    from_date = (get_ist_now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    from_date = (get_ist_today() - timedelta(days=days)).isoformat()
     
     if vital_type:
         query = """
-            SELECT vs.*, u.full_name as recorded_by_name
+            SELECT vs.id, vs.patient_id, vs.vital_type, vs.value, vs.unit,
+                   vs.recorded_at, vs.recorded_by, vs.notes,
+                   u.full_name as recorded_by_name
             FROM vital_signs vs
             LEFT JOIN users u ON vs.recorded_by = u.id
             WHERE vs.patient_id = ? AND vs.vital_type = ? AND DATE(vs.recorded_at) >= ?
             ORDER BY vs.recorded_at DESC
         """
-        return execute_query(query, (patient_id, vital_type, from_date), fetchall=True)
+        return execute_query(query, (patient_id, vital_type, from_date), fetchall=True, as_dict=False)
     else:
         query = """
-            SELECT vs.*, u.full_name as recorded_by_name
+            SELECT vs.id, vs.patient_id, vs.vital_type, vs.value, vs.unit,
+                   vs.recorded_at, vs.recorded_by, vs.notes,
+                   u.full_name as recorded_by_name
             FROM vital_signs vs
             LEFT JOIN users u ON vs.recorded_by = u.id
             WHERE vs.patient_id = ? AND DATE(vs.recorded_at) >= ?
             ORDER BY vs.recorded_at DESC
         """
-        return execute_query(query, (patient_id, from_date), fetchall=True)
+        return execute_query(query, (patient_id, from_date), fetchall=True, as_dict=False)
+
+
+# Days of readings analyze_vital_trends() compares, split into two halves
+VITAL_TREND_DAYS = 14
+
+
+# Text _vital_numeric() parses: systolic for blood pressure, the value for
+# the other tracked types, and 0 for any other type
+_VITAL_TEXT_SQL = """
+    CASE WHEN vital_type = 'blood_pressure' AND instr(value, '/') > 0
+              THEN substr(value, 1, instr(value, '/') - 1)
+         WHEN vital_type IN ('blood_pressure', 'weight', 'blood_sugar', 'temperature') THEN value
+         ELSE '0' END
+"""
+
+# reading_text as a number, or NULL where float() would raise. CAST alone reads
+# 'abc' as 0.0 and '120abc' as 120, so only plain decimals are cast.
+_VITAL_NUMERIC_SQL = """
+    CASE WHEN trim(reading_text) GLOB '*[0-9]*'
+          AND NOT trim(reading_text) GLOB '*[^0-9.]*'
+          AND NOT trim(reading_text) GLOB '*.*.*'
+         THEN CAST(trim(reading_text) AS REAL) END
+"""
+
+
+# Result when there are too few readings to compare
+_NO_VITAL_TREND = {
+    'current': None,
+    'trend': 'stable',
+    'alert': False,
+    'alert_message': None
+}
 
 
 def analyze_vital_trends(patient_id, vital_type):
@@ -1358,42 +2009,52 @@ def analyze_vital_trends(patient_id, vital_type):
         'alert_message': string
     }
     """
-    # Get last 14 days of data
-    recent_vitals = get_patient_vitals(patient_id, vital_type, days=14)
-    
-    if not recent_vitals or len(recent_vitals) < 2:
-        return {
-            'current': None,
-            'trend': 'stable',
-            'alert': False,
-            'alert_message': None
-        }
-    
-    # Split into recent week and previous week
-    mid_point = len(recent_vitals) // 2
-    recent_week = recent_vitals[:mid_point] if mid_point > 0 else recent_vitals
-    previous_week = recent_vitals[mid_point:] if mid_point > 0 else []
-    
-    current_value = recent_vitals[0]['value']
-    
-    # Calculate average for trend (simplified for numeric vitals)
-    def extract_numeric(value, vital_type):
-        """Extract numeric value from vital reading"""
-        if vital_type == 'blood_pressure':
-            # Use systolic (first number)
-            return float(value.split('/')[0])
-        elif vital_type == 'weight':
-            return float(value)
-        elif vital_type == 'blood_sugar':
-            return float(value)
-        elif vital_type == 'temperature':
-            return float(value)
-        return 0
+    from_date = (get_ist_today() - timedelta(days=VITAL_TREND_DAYS)).isoformat()
+    
+    # Last 14 days of readings, newest first, aggregated in SQLite: the newer
+    # half of the readings is the recent week, the rest the previous week
+    query = f"""
+        SELECT COUNT(*) AS readings,
+               COUNT(*) - COUNT(reading) AS malformed,
+               MAX(CASE WHEN newest = 1 THEN value END) AS current,
+               AVG(CASE WHEN newest <= half THEN reading END) AS recent_avg,
+               AVG(CASE WHEN newest > half THEN reading END) AS previous_avg
+        FROM (
+            SELECT value, newest, half,
+                   {_VITAL_NUMERIC_SQL} AS reading
+            FROM (
+                SELECT value,
+                       {_VITAL_TEXT_SQL} AS reading_text,
+                       ROW_NUMBER() OVER (ORDER BY recorded_at DESC) AS newest,
+                       COUNT(*) OVER () / 2 AS half
+                FROM vital_signs
+                WHERE patient_id = ? AND vital_type = ? AND DATE(recorded_at) >= ?
+            )
+        )
+    """
+    stats = execute_query(query, (patient_id, vital_type, from_date), fetchone=True)
     
+    if stats['readings'] < 2:
+        return _NO_VITAL_TREND.copy()
+    if stats['malformed']:
+        # A reading that does not parse leaves the trend undetermined
+        return dict(_NO_VITAL_TREND, current=stats['current'])
+    return _vital_trend(vital_type, stats['current'], stats['recent_avg'], stats['previous_avg'])
+
+
+def _vital_numeric(value, vital_type):
+    """Extract numeric value from vital reading"""
+    if vital_type == 'blood_pressure':
+        # Use systolic (first number)
+        return float(value.split('/')[0])
+    elif vital_type in ('weight', 'blood_sugar', 'temperature'):
+        return float(value)
+    return 0
+
+
+def _vital_trend(vital_type, current_value, recent_avg, previous_avg):
+    """Classify the trend between the two weekly averages and check the latest reading"""
     try:
-        recent_avg = sum(extract_numeric(v['value'], vital_type) for v in recent_week) / len(recent_week)
-        previous_avg = sum(extract_numeric(v['value'], vital_type) for v in previous_week) / len(previous_week) if previous_week else recent_avg
-        
         # Determine trend
         diff_percent = ((recent_avg - previous_avg) / previous_avg * 100) if previous_avg > 0 else 0
         
@@ -1408,7 +2069,7 @@ def analyze_vital_trends(patient_id, vital_type):
         alert = False
         alert_message = None
         
-        current_numeric = extract_numeric(current_value, vital_type)
+        current_numeric = _vital_numeric(current_value, vital_type)
         
         if vital_type == 'blood_pressure':
             systolic = current_numeric
@@ -1451,58 +2112,67 @@ def analyze_vital_trends(patient_id, vital_type):
             'previous_avg': round(previous_avg, 1)
         }
     
-    except Exception as e:
-        return {
-            'current': current_value,
-            'trend': 'stable',
-            'alert': False,
-            'alert_message': None
-        }
+    except Exception:
+        return dict(_NO_VITAL_TREND, current=current_value)
+
+
+# One row per vital type: its newest reading, plus the trend averages of
+# analyze_vital_trends(). Readings in the trend window are always the newest
+# ones, so a single ranking serves both.
+_RECENT_VITALS_SQL = f"""
+    SELECT vital_type,
+           MAX(CASE WHEN newest = 1 THEN value END) AS value,
+           MAX(CASE WHEN newest = 1 THEN unit END) AS unit,
+           MAX(CASE WHEN newest = 1 THEN substr(recorded_at, 1, 10) END) AS recorded_date,
+           SUM(in_window) AS readings,
+           SUM(in_window AND reading IS NULL) AS malformed,
+           AVG(CASE WHEN in_window AND newest <= half THEN reading END) AS recent_avg,
+           AVG(CASE WHEN in_window AND newest > half THEN reading END) AS previous_avg
+    FROM (
+        SELECT vital_type, value, unit, recorded_at, in_window,
+               {_VITAL_NUMERIC_SQL} AS reading,
+               ROW_NUMBER() OVER (PARTITION BY vital_type ORDER BY recorded_at DESC) AS newest,
+               SUM(in_window) OVER (PARTITION BY vital_type) / 2 AS half
+        FROM (
+            SELECT vital_type, value, unit, recorded_at,
+                   {_VITAL_TEXT_SQL} AS reading_text,
+                   DATE(recorded_at) >= ? AS in_window
+            FROM vital_signs
+            WHERE patient_id = ?
+        )
+    )
+    GROUP BY vital_type
+"""
 
 
+@_patient_context_cached
 def get_patient_recent_vitals(patient_id):
     """
     Get patient's most recent vitals WITH TREND ANALYSIS for chatbot context.
     Includes current value, 7-day averages, trend direction, percentage change, and alerts.
     Returns formatted string with comprehensive vitals data.
     """
-    today = get_ist_today().strftime('%Y-%m-%d')
-    yesterday = (get_ist_now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    today_date = get_ist_today()
+    today = today_date.isoformat()
+    yesterday = (today_date - timedelta(days=1)).isoformat()
+    trend_from = (today_date - timedelta(days=VITAL_TREND_DAYS)).isoformat()
     
     vital_types = ['blood_pressure', 'blood_sugar', 'weight', 'temperature']
     vitals_summary = []
     
+    latest_by_type = {
+        row['vital_type']: row
+        for row in execute_query(_RECENT_VITALS_SQL, (trend_from, patient_id), fetchall=True, as_dict=False)
+    }
+    
     for vital_type in vital_types:
-        # Try today first
-        query = """
-            SELECT value, unit, recorded_at
-            FROM vital_signs
-            WHERE patient_id = ? AND vital_type = ? AND DATE(recorded_at) = ?
-            ORDER BY recorded_at DESC
-            LIMIT 1
-        """
-        result = execute_query(query, (patient_id, vital_type, today), fetchone=True)
-        
-        # If not today, try yesterday
-        if not result:
-            result = execute_query(query, (patient_id, vital_type, yesterday), fetchone=True)
-        
-        # If still not found, get the last available entry
-        if not result:
-            query_last = """
-                SELECT value, unit, recorded_at
-                FROM vital_signs
-                WHERE patient_id = ? AND vital_type = ?
-                ORDER BY recorded_at DESC
-                LIMIT 1
-            """
-            result = execute_query(query_last, (patient_id, vital_type), fetchone=True)
+        result = latest_by_type.get(vital_type)
         
         # Format the vital sign WITH TREND ANALYSIS
         if result:
             value = result['value']
             unit = result['unit']
-            recorded_date = result['recorded_at'][:10]
+            recorded_date = result['recorded_date']
             
             # Determine when it was recorded
             if recorded_date == today:
@@ -1512,8 +2182,12 @@ def get_patient_recent_vitals(patient_id):
             else:
                 when = f"on {recorded_date}"
             
-            # Get trend analysis
-            trend_data = analyze_vital_trends(patient_id, vital_type)
+            # Trend analysis from the averages already aggregated; a malformed
+            # reading leaves it undetermined, as in analyze_vital_trends()
+            if result['readings'] >= 2 and not result['malformed']:
+                trend_data = _vital_trend(vital_type, value, result['recent_avg'], result['previous_avg'])
+            else:
+                trend_data = None
             
             # Format display name
             vital_names = {
@@ -1562,31 +2236,138 @@ def get_patient_recent_vitals(patient_id):
         return "No vital signs recorded yet."
 
 
-def get_patient_medical_summary(patient_id):
-    """
-    Get compact medical summary for chatbot context (appointments + prescriptions).
-    Includes: last appointment, next appointment, active prescriptions count, past visits count.
-    Returns formatted string with essential medical history.
-    """
-    summary_parts = []
-    
-    # Get last completed appointment
-    last_appt_query = """
-        SELECT a.date, a.time,
+# Chatbot context queries, run on every chat turn. Kept at module level so each
+# call hands sqlite3 the same SQL text and hits the connection's statement cache.
+# The medical summary ones take a list of patients; {ids} is filled with one
+# placeholder per patient, so the single-patient text is always the same.
+
+# Each patient's last completed appointment, with its prescription if any.
+# Only the medicine count and first medicine are shown, so JSON1 extracts
+# them; malformed medicines_json reads as no medicines.
+_LAST_COMPLETED_APPOINTMENT_SQL = """
+    SELECT patient_id, date, time, doctor_name, specialization, diagnosis,
+           json_array_length(medicines_json) AS med_count,
+           json_extract(medicines_json, '$[0].name') AS first_med_name,
+           json_extract(medicines_json, '$[0].dosage') AS first_med_dosage,
+           json_extract(medicines_json, '$[0].timing') AS first_med_timing
+    FROM (
+        SELECT a.patient_id, a.date, a.time,
                u.full_name as doctor_name,
                d.specialization,
-               p.id as prescription_id,
                p.diagnosis,
-               p.medicines_json
+               CASE WHEN json_valid(p.medicines_json) THEN p.medicines_json END AS medicines_json,
+               ROW_NUMBER() OVER (PARTITION BY a.patient_id ORDER BY a.date DESC, a.time DESC) AS rn
         FROM appointments a
         JOIN users u ON a.doctor_id = u.id
         JOIN doctor_details d ON u.id = d.user_id
         LEFT JOIN prescriptions p ON a.id = p.appointment_id
-        WHERE a.patient_id = ? AND a.status = 'COMPLETED'
-        ORDER BY a.date DESC, a.time DESC
-        LIMIT 1
+        WHERE a.patient_id IN ({ids}) AND a.status = 'COMPLETED'
+    )
+    WHERE rn = 1
+"""
+
+# Each patient's next upcoming appointment
+_NEXT_APPOINTMENT_SQL = """
+    SELECT patient_id, date, time, symptoms, status, doctor_name, specialization
+    FROM (
+        SELECT a.patient_id, a.date, a.time, a.symptoms, a.status,
+               u.full_name as doctor_name,
+               d.specialization,
+               ROW_NUMBER() OVER (PARTITION BY a.patient_id ORDER BY a.date ASC, a.time ASC) AS rn
+        FROM appointments a
+        JOIN users u ON a.doctor_id = u.id
+        JOIN doctor_details d ON u.id = d.user_id
+        WHERE a.patient_id IN ({ids}) AND a.status IN ('PENDING', 'CONFIRMED')
+        AND a.date >= ?
+    )
+    WHERE rn = 1
+"""
+
+# Total prescription count per patient
+_PRESCRIPTION_COUNT_SQL = """
+    SELECT patient_id, COUNT(*) as count
+    FROM prescriptions
+    WHERE patient_id IN ({ids})
+    GROUP BY patient_id
+"""
+
+# Appointment statistics per patient
+_APPOINTMENT_STATS_SQL = """
+    SELECT patient_id,
+        COUNT(CASE WHEN status = 'COMPLETED' THEN 1 END) as completed_count,
+        COUNT(CASE WHEN status IN ('PENDING', 'CONFIRMED') THEN 1 END) as upcoming_count,
+        COUNT(*) as total_count
+    FROM appointments
+    WHERE patient_id IN ({ids})
+    GROUP BY patient_id
+"""
+
+
+@_patient_context_cached
+def get_patient_medical_summary(patient_id):
+    """
+    Get compact medical summary for chatbot context (appointments + prescriptions).
+    Includes: last appointment, next appointment, active prescriptions count, past visits count.
+    Returns formatted string with essential medical history.
+    """
+    return get_medical_summaries_bulk([patient_id])[patient_id]
+
+
+def get_medical_summaries_bulk(patient_ids):
+    """
+    Medical summaries for many patients at once, for screens that list patients.
+    Runs the same four queries as a single summary, each covering every patient.
+    
+    Args:
+        patient_ids: IDs of the patients to summarize
+    
+    Returns:
+        dict mapping each patient ID to its formatted summary string
     """
-    last_appt = execute_query(last_appt_query, (patient_id,), fetchone=True)
+    patient_ids = list(dict.fromkeys(patient_ids))
+    if not patient_ids:
+        return {}
+    
+    ids = ', '.join('?' * len(patient_ids))
+    params = tuple(patient_ids)
+    today = get_ist_today().isoformat()
+    
+    with _pool.acquire() as conn:
+        last_appts = {
+            row['patient_id']: row
+            for row in execute_query(_LAST_COMPLETED_APPOINTMENT_SQL.format(ids=ids), params,
+                                     fetchall=True, as_dict=False, conn=conn)
+        }
+        next_appts = {
+            row['patient_id']: row
+            for row in execute_query(_NEXT_APPOINTMENT_SQL.format(ids=ids), params + (today,),
+                                     fetchall=True, as_dict=False, conn=conn)
+        }
+        presc_counts = {
+            row['patient_id']: row['count']
+            for row in execute_query(_PRESCRIPTION_COUNT_SQL.format(ids=ids), params,
+                                     fetchall=True, as_dict=False, conn=conn)
+        }
+        appt_stats = {
+            row['patient_id']: row
+            for row in execute_query(_APPOINTMENT_STATS_SQL.format(ids=ids), params,
+                                     fetchall=True, as_dict=False, conn=conn)
+        }
+    
+    return {
+        patient_id: _format_medical_summary(
+            last_appts.get(patient_id),
+            next_appts.get(patient_id),
+            presc_counts.get(patient_id, 0),
+            appt_stats.get(patient_id)
+        )
+        for patient_id in patient_ids
+    }
+
+
+def _format_medical_summary(last_appt, next_appt, presc_count, appt_stats):
+    """Render one patient's medical summary from its rows"""
+    summary_parts = []
     
     if last_appt:
         doctor_info = f"Dr. {last_appt['doctor_name']} ({last_appt['specialization']})"
@@ -1594,42 +2375,19 @@ def get_patient_medical_summary(patient_id):
         
         last_appt_text = f"Last Appointment: {doctor_info} on {appt_date}"
         
-        if last_appt['prescription_id'] and last_appt['medicines_json']:
-            import json
-            try:
-                meds = json.loads(last_appt['medicines_json'])
-                if meds:
-                    med_count = len(meds)
-                    first_med = meds[0]
-                    med_name = first_med.get('name', 'Unknown')
-                    dosage = first_med.get('dosage', '')
-                    timing = first_med.get('timing', '')
-                    
-                    if med_count == 1:
-                        last_appt_text += f"\n  Prescribed: {med_name} {dosage} ({timing})"
-                    else:
-                        last_appt_text += f"\n  Prescribed: {med_name} {dosage} ({timing}) + {med_count - 1} more"
-            except:
-                pass
+        med_count = last_appt['med_count']
+        if med_count:
+            med_name = last_appt['first_med_name'] or 'Unknown'
+            dosage = last_appt['first_med_dosage'] or ''
+            timing = last_appt['first_med_timing'] or ''
+            
+            if med_count == 1:
+                last_appt_text += f"\n  Prescribed: {med_name} {dosage} ({timing})"
+            else:
+                last_appt_text += f"\n  Prescribed: {med_name} {dosage} ({timing}) + {med_count - 1} more"
         
         summary_parts.append(last_appt_text)
     
-    # Get next upcoming appointment
-    next_appt_query = """
-        SELECT a.date, a.time, a.symptoms, a.status,
-               u.full_name as doctor_name,
-               d.specialization
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        JOIN doctor_details d ON u.id = d.user_id
-        WHERE a.patient_id = ? AND a.status IN ('PENDING', 'CONFIRMED')
-        AND a.date >= ?
-        ORDER BY a.date ASC, a.time ASC
-        LIMIT 1
-    """
-    today = get_ist_today().strftime('%Y-%m-%d')
-    next_appt = execute_query(next_appt_query, (patient_id, today), fetchone=True)
-    
     if next_appt:
         doctor_info = f"Dr. {next_appt['doctor_name']} ({next_appt['specialization']})"
         appt_date = next_appt['date']
@@ -1640,26 +2398,8 @@ def get_patient_medical_summary(patient_id):
         next_appt_text = f"Next Appointment: {doctor_info} on {appt_date} at {appt_time} (Status: {status})\n  Reason: {reason}"
         summary_parts.append(next_appt_text)
     
-    # Get total prescription count
-    prescription_count_query = """
-        SELECT COUNT(*) as count
-        FROM prescriptions
-        WHERE patient_id = ?
-    """
-    presc_count = execute_query(prescription_count_query, (patient_id,), fetchone=True)
-    if presc_count and presc_count['count'] > 0:
-        summary_parts.append(f"Total Prescriptions Received: {presc_count['count']}")
-    
-    # Get appointment statistics
-    appointment_stats_query = """
-        SELECT 
-            COUNT(CASE WHEN status = 'COMPLETED' THEN 1 END) as completed_count,
-            COUNT(CASE WHEN status IN ('PENDING', 'CONFIRMED') THEN 1 END) as upcoming_count,
-            COUNT(*) as total_count
-        FROM appointments
-        WHERE patient_id = ?
-    """
-    appt_stats = execute_query(appointment_stats_query, (patient_id,), fetchone=True)
+    if presc_count > 0:
+        summary_parts.append(f"Total Prescriptions Received: {presc_count}")
     
     if appt_stats and appt_stats['total_count'] > 0:
         stats_text = f"Appointment History: {appt_stats['completed_count']} completed"
@@ -1673,35 +2413,36 @@ def get_patient_medical_summary(patient_id):
         return "No medical history found."
 
 
+_APPOINTMENT_FULL_DETAILS_SQL = """
+    SELECT a.*,
+           u.full_name as doctor_name,
+           d.specialization,
+           d.qualification,
+           p.diagnosis,
+           p.medicines_json,
+           p.notes
+    FROM appointments a
+    JOIN users u ON a.doctor_id = u.id
+    JOIN doctor_details d ON u.id = d.user_id
+    LEFT JOIN prescriptions p ON a.id = p.appointment_id
+    WHERE a.patient_id = ? AND a.id = ?
+"""
+
+
 def get_appointment_full_details(patient_id, appointment_id):
     """
     FUNCTION CALLING: Get complete details of a specific appointment.
     Returns: appointment info, diagnosis, full prescription with all medicines.
     """
-    query = """
-        SELECT a.*,
-               u.full_name as doctor_name,
-               d.specialization,
-               d.qualification,
-               p.diagnosis,
-               p.medicines_json,
-               p.notes
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        JOIN doctor_details d ON u.id = d.user_id
-        LEFT JOIN prescriptions p ON a.id = p.appointment_id
-        WHERE a.patient_id = ? AND a.id = ?
-    """
-    result = execute_query(query, (patient_id, appointment_id), fetchone=True)
+    result = execute_query(_APPOINTMENT_FULL_DETAILS_SQL, (patient_id, appointment_id), fetchone=True)
     
     if not result:
         return {"error": "Appointment not found"}
     
-    import json
     medicines = []
     if result['medicines_json']:
         try:
-            medicines = json.loads(result['medicines_json'])
+            medicines = _parse_json(result['medicines_json'])
         except:
             pass
     
@@ -1719,24 +2460,37 @@ def get_appointment_full_details(patient_id, appointment_id):
     }
 
 
+_PRESCRIPTIONS_DETAILED_SQL = """
+    SELECT p.id, p.diagnosis, p.medicines_json, p.notes,
+           substr(p.created_at, 1, 10) as created_date,
+           u.full_name as doctor_name,
+           d.specialization
+    FROM prescriptions p
+    JOIN users u ON p.doctor_id = u.id
+    JOIN doctor_details d ON u.id = d.user_id
+    WHERE p.patient_id = ?
+    ORDER BY p.created_at DESC
+"""
+
+
+@_patient_context_cached
 def get_all_patient_prescriptions_detailed(patient_id):
     """
     FUNCTION CALLING: Get ALL prescriptions with complete medication details.
     Returns: list of all prescriptions with medicines breakdown.
     """
-    prescriptions = get_patient_prescriptions(patient_id)
+    prescriptions = execute_query(_PRESCRIPTIONS_DETAILED_SQL, (patient_id,), fetchall=True, as_dict=False)
     
     if not prescriptions:
         return {"message": "No prescriptions found"}
     
-    import json
     detailed_list = []
     
     for presc in prescriptions:
         medicines = []
         if presc['medicines_json']:
             try:
-                medicines = json.loads(presc['medicines_json'])
+                medicines = _parse_json(presc['medicines_json'])
             except:
                 pass
         
@@ -1744,7 +2498,7 @@ def get_all_patient_prescriptions_detailed(patient_id):
             "prescription_id": presc['id'],
             "doctor_name": presc['doctor_name'],
             "specialization": presc['specialization'],
-            "date": presc['created_at'][:10],
+            "date": presc['created_date'],
             "diagnosis": presc['diagnosis'],
             "medicines": medicines,
             "notes": presc['notes']
@@ -1753,38 +2507,48 @@ def get_all_patient_prescriptions_detailed(patient_id):
     return {"prescriptions": detailed_list, "total_count": len(detailed_list)}
 
 
+_PAST_APPOINTMENTS_BASE_SQL = """
+    SELECT a.id, a.date, a.time, a.symptoms,
+           u.full_name as doctor_name,
+           d.specialization,
+           p.id as has_prescription,
+           p.diagnosis
+    FROM appointments a
+    JOIN users u ON a.doctor_id = u.id
+    JOIN doctor_details d ON u.id = d.user_id
+    LEFT JOIN prescriptions p ON a.id = p.appointment_id
+    WHERE a.patient_id = ? AND a.status = 'COMPLETED'
+"""
+
+# Every filter combination spelled out once, keyed by
+# (filter by doctor name, filter by start date)
+_PAST_APPOINTMENTS_SQL = {
+    (by_doctor, by_date): (
+        _PAST_APPOINTMENTS_BASE_SQL
+        + (" AND u.full_name LIKE ?" if by_doctor else "")
+        + (" AND a.date >= ?" if by_date else "")
+        + " ORDER BY a.date DESC, a.time DESC LIMIT ?"
+    )
+    for by_doctor in (False, True)
+    for by_date in (False, True)
+}
+
+
 def get_past_appointments_filtered(patient_id, limit=10, doctor_name=None, date_from=None):
     """
     FUNCTION CALLING: Get past appointments with optional filters.
     Can filter by doctor name and date range.
     """
-    query = """
-        SELECT a.id, a.date, a.time, a.symptoms,
-               u.full_name as doctor_name,
-               d.specialization,
-               p.id as has_prescription,
-               p.diagnosis
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        JOIN doctor_details d ON u.id = d.user_id
-        LEFT JOIN prescriptions p ON a.id = p.appointment_id
-        WHERE a.patient_id = ? AND a.status = 'COMPLETED'
-    """
-    
     params = [patient_id]
-    
     if doctor_name:
-        query += " AND u.full_name LIKE ?"
         params.append(f"%{doctor_name}%")
-    
     if date_from:
-        query += " AND a.date >= ?"
         params.append(date_from)
-    
-    query += " ORDER BY a.date DESC, a.time DESC LIMIT ?"
     params.append(limit)
     
-    results = execute_query(query, tuple(params), fetchall=True)
+    query = _PAST_APPOINTMENTS_SQL[bool(doctor_name), bool(date_from)]
+    
+    results = execute_query(query, tuple(params), fetchall=True, as_dict=False)
     
     if not results:
         return {"message": "No past appointments found", "appointments": []}
@@ -1805,25 +2569,28 @@ def get_past_appointments_filtered(patient_id, limit=10, doctor_name=None, date_
     return {"appointments": appointments, "total_count": len(appointments)}
 
 
+_ALL_APPOINTMENTS_SUMMARY_SQL = """
+    SELECT a.id, a.date, a.time, a.symptoms, a.status,
+           substr(a.created_at, 1, 10) as booked_on,
+           u.full_name as doctor_name,
+           d.specialization,
+           p.id as has_prescription
+    FROM appointments a
+    JOIN users u ON a.doctor_id = u.id
+    JOIN doctor_details d ON u.id = d.user_id
+    LEFT JOIN prescriptions p ON a.id = p.appointment_id
+    WHERE a.patient_id = ?
+    ORDER BY a.date DESC, a.time DESC
+"""
+
+
+@_patient_context_cached
 def get_all_appointments_summary(patient_id):
     """
     FUNCTION CALLING: Get ALL appointments (past, upcoming, confirmed, pending, rejected).
     Returns complete appointment list with status for each.
     """
-    query = """
-        SELECT a.id, a.date, a.time, a.symptoms, a.status, a.created_at,
-               u.full_name as doctor_name,
-               d.specialization,
-               p.id as has_prescription
-        FROM appointments a
-        JOIN users u ON a.doctor_id = u.id
-        JOIN doctor_details d ON u.id = d.user_id
-        LEFT JOIN prescriptions p ON a.id = p.appointment_id
-        WHERE a.patient_id = ?
-        ORDER BY a.date DESC, a.time DESC
-    """
-    
-    results = execute_query(query, (patient_id,), fetchall=True)
+    results = execute_query(_ALL_APPOINTMENTS_SUMMARY_SQL, (patient_id,), fetchall=True, as_dict=False)
     
     if not results:
         return {"message": "No appointments found", "appointments": []}
@@ -1836,7 +2603,7 @@ def get_all_appointments_summary(patient_id):
             "specialization": appt['specialization'],
             "scheduled_date": appt['date'],
             "scheduled_time": appt['time'],
-            "booked_on": appt['created_at'][:10],
+            "booked_on": appt['booked_on'],
             "status": appt['status'],
             "symptoms": appt['symptoms'],
             "has_prescription": bool(appt['has_prescription'])
@@ -94,7 +94,9 @@ class DoctorDetails:
     def create_indexes_sql():
         return [
             "CREATE INDEX IF NOT EXISTS idx_doctor_user_id ON doctor_details(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_doctor_specialization ON doctor_details(specialization)"
+            "CREATE INDEX IF NOT EXISTS idx_doctor_specialization ON doctor_details(specialization)",
+            # Doctor listings walk this in rating order; only ties get sorted by name
+            "CREATE INDEX IF NOT EXISTS idx_doctor_rating ON doctor_details(average_rating DESC, user_id)"
         ]
 
 
@@ -130,11 +132,18 @@ class Appointment:
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_appointment_patient ON appointments(patient_id)",
-            "CREATE INDEX IF NOT EXISTS idx_appointment_doctor ON appointments(doctor_id)",
+            # Leading columns of the composite indexes below, so they only cost writes
+            "DROP INDEX IF EXISTS idx_appointment_patient",
+            "DROP INDEX IF EXISTS idx_appointment_doctor",
             "CREATE INDEX IF NOT EXISTS idx_appointment_date ON appointments(date)",
             "CREATE INDEX IF NOT EXISTS idx_appointment_status ON appointments(status)",
-            "CREATE INDEX IF NOT EXISTS idx_appointment_parent ON appointments(parent_appointment_id)"
+            "CREATE INDEX IF NOT EXISTS idx_appointment_parent ON appointments(parent_appointment_id)",
+            "CREATE INDEX IF NOT EXISTS idx_appointment_doctor_date ON appointments(doctor_id, date, status)",
+            "CREATE INDEX IF NOT EXISTS idx_appointment_patient_date ON appointments(patient_id, date DESC, time DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_appointment_doctor_created ON appointments(doctor_id, created_at DESC)",
+            # Overlapped idx_appointment_doctor_date, which also checks status in the index
+            "DROP INDEX IF EXISTS idx_appointment_doctor_status_date",
+            "CREATE INDEX IF NOT EXISTS idx_appointment_patient_status_date ON appointments(patient_id, status, date, time)"
         ]
 
 
@@ -165,9 +174,11 @@ class Prescription:
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_prescription_patient ON prescriptions(patient_id)",
+            # Leading column of idx_prescription_patient_created
+            "DROP INDEX IF EXISTS idx_prescription_patient",
             "CREATE INDEX IF NOT EXISTS idx_prescription_doctor ON prescriptions(doctor_id)",
-            "CREATE INDEX IF NOT EXISTS idx_prescription_appointment ON prescriptions(appointment_id)"
+            "CREATE INDEX IF NOT EXISTS idx_prescription_appointment ON prescriptions(appointment_id)",
+            "CREATE INDEX IF NOT EXISTS idx_prescription_patient_created ON prescriptions(patient_id, created_at DESC)"
         ]
 
 
@@ -196,8 +207,10 @@ class Upload:
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_upload_patient ON uploads(patient_id)",
-            "CREATE INDEX IF NOT EXISTS idx_upload_type ON uploads(upload_type)"
+            # Leading column of idx_upload_patient_type
+            "DROP INDEX IF EXISTS idx_upload_patient",
+            "CREATE INDEX IF NOT EXISTS idx_upload_type ON uploads(upload_type)",
+            "CREATE INDEX IF NOT EXISTS idx_upload_patient_type ON uploads(patient_id, upload_type, uploaded_at DESC)"
         ]
 
 
@@ -230,8 +243,13 @@ class Notification:
     def create_indexes_sql():
         return [
             "CREATE INDEX IF NOT EXISTS idx_notification_user ON notifications(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_notification_read ON notifications(is_read)",
-            "CREATE INDEX IF NOT EXISTS idx_notification_created ON notifications(created_at)"
+            # A two-valued column on its own; idx_notification_unread below serves
+            # every is_read = 0 lookup, so the old full index is dropped
+            "DROP INDEX IF EXISTS idx_notification_read",
+            "CREATE INDEX IF NOT EXISTS idx_notification_created ON notifications(created_at)",
+            # Only unread rows, so it stays small while read notifications wait for cleanup.
+            # Serves the badge count and the unread dropdown list without a sort.
+            "CREATE INDEX IF NOT EXISTS idx_notification_unread ON notifications(user_id, created_at DESC) WHERE is_read = 0"
         ]
 
 
@@ -252,6 +270,7 @@ class DoctorRating:
             rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
             review_text TEXT,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            patient_name TEXT,
             FOREIGN KEY (doctor_id) REFERENCES users(id) ON DELETE CASCADE,
             FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
             FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE SET NULL,
@@ -259,12 +278,278 @@ class DoctorRating:
         )
         """
     
+    @staticmethod
+    def added_columns_sql():
+        # Columns added after the table first shipped: (name, definition, backfill)
+        return [
+            # Reviewer's name, copied at insert so listing ratings needs no users join
+            ("patient_name", "TEXT",
+             "UPDATE doctor_ratings SET patient_name = "
+             "(SELECT full_name FROM users WHERE users.id = doctor_ratings.patient_id)")
+        ]
+    
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_rating_doctor ON doctor_ratings(doctor_id)",
+            # Leading column of idx_rating_doctor_created
+            "DROP INDEX IF EXISTS idx_rating_doctor",
             "CREATE INDEX IF NOT EXISTS idx_rating_patient ON doctor_ratings(patient_id)",
-            "CREATE INDEX IF NOT EXISTS idx_rating_created ON doctor_ratings(created_at)"
+            "CREATE INDEX IF NOT EXISTS idx_rating_created ON doctor_ratings(created_at)",
+            # get_doctor_ratings reads the newest N straight off this index.
+            # check_existing_rating uses the UNIQUE(patient_id, appointment_id) autoindex.
+            "CREATE INDEX IF NOT EXISTS idx_rating_doctor_created ON doctor_ratings(doctor_id, created_at DESC)"
+        ]
+    
+    @staticmethod
+    def create_triggers_sql():
+        # Keep doctor_details.average_rating / total_ratings in step with
+        # doctor_ratings. SET expressions all read the row's values from before
+        # the update, so each trigger folds one rating in or out in O(1).
+        return [
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_rating_ai AFTER INSERT ON doctor_ratings
+            BEGIN
+                UPDATE doctor_details
+                SET average_rating = (average_rating * total_ratings + NEW.rating) / (total_ratings + 1),
+                    total_ratings = total_ratings + 1
+                WHERE user_id = NEW.doctor_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_rating_ad AFTER DELETE ON doctor_ratings
+            BEGIN
+                UPDATE doctor_details
+                SET average_rating = CASE WHEN total_ratings > 1
+                        THEN (average_rating * total_ratings - OLD.rating) / (total_ratings - 1)
+                        ELSE 0.0 END,
+                    total_ratings = MAX(total_ratings - 1, 0)
+                WHERE user_id = OLD.doctor_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_rating_patient_name AFTER UPDATE OF full_name ON users
+            BEGIN
+                UPDATE doctor_ratings SET patient_name = NEW.full_name WHERE patient_id = NEW.id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_rating_au AFTER UPDATE OF doctor_id, rating ON doctor_ratings
+            BEGIN
+                UPDATE doctor_details
+                SET average_rating = CASE WHEN total_ratings > 1
+                        THEN (average_rating * total_ratings - OLD.rating) / (total_ratings - 1)
+                        ELSE 0.0 END,
+                    total_ratings = MAX(total_ratings - 1, 0)
+                WHERE user_id = OLD.doctor_id;
+                UPDATE doctor_details
+                SET average_rating = (average_rating * total_ratings + NEW.rating) / (total_ratings + 1),
+                    total_ratings = total_ratings + 1
+                WHERE user_id = NEW.doctor_id;
+            END
+            """
+        ]
+
+
+class DoctorSearch:
+    """
+    Materialized doctor search results: one row per doctor with the searched
+    columns pre-lowercased and the rating copied from doctor_details.
+    Kept in sync by triggers on users and doctor_details; never written directly.
+    """
+    TABLE_NAME = "mv_doctor_search"
+    
+    @staticmethod
+    def create_table_sql():
+        return """
+        CREATE TABLE IF NOT EXISTS mv_doctor_search (
+            user_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            specialization TEXT NOT NULL,
+            qualification TEXT,
+            experience_years INTEGER,
+            consultation_fee REAL,
+            average_rating REAL,
+            total_ratings INTEGER,
+            name_lower TEXT NOT NULL,
+            spec_lower TEXT NOT NULL,
+            qual_lower TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+    
+    @staticmethod
+    def populate_sql(where=""):
+        # Rebuilds the rows of every doctor matched by `where`
+        return f"""
+        INSERT OR REPLACE INTO mv_doctor_search (
+            user_id, full_name, specialization, qualification, experience_years,
+            consultation_fee, average_rating, total_ratings,
+            name_lower, spec_lower, qual_lower
+        )
+        SELECT u.id, u.full_name, d.specialization, d.qualification, d.experience_years,
+               d.consultation_fee, d.average_rating, d.total_ratings,
+               lower(u.full_name), lower(d.specialization), lower(d.qualification)
+        FROM users u
+        JOIN doctor_details d ON u.id = d.user_id
+        WHERE u.role = 'DOCTOR' {where}
+        """
+    
+    @staticmethod
+    def create_indexes_sql():
+        return [
+            # Matches search_doctors' ORDER BY, so LIMIT 20 stops at the 20th hit
+            "CREATE INDEX IF NOT EXISTS idx_doctor_search_rating ON mv_doctor_search(average_rating DESC, full_name)"
+        ]
+    
+    @staticmethod
+    def create_triggers_sql():
+        refresh = DoctorSearch.populate_sql("AND d.user_id = NEW.user_id")
+        return [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_doctor_search_ai AFTER INSERT ON doctor_details
+            BEGIN
+                {refresh};
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_doctor_search_au
+            AFTER UPDATE OF specialization, qualification, experience_years, consultation_fee ON doctor_details
+            BEGIN
+                {refresh};
+            END
+            """,
+            # Fired by the doctor_ratings triggers on every rating, so it only
+            # copies the two figures instead of rebuilding the row
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_doctor_search_rating
+            AFTER UPDATE OF average_rating, total_ratings ON doctor_details
+            BEGIN
+                UPDATE mv_doctor_search
+                SET average_rating = NEW.average_rating, total_ratings = NEW.total_ratings
+                WHERE user_id = NEW.user_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_doctor_search_ad AFTER DELETE ON doctor_details
+            BEGIN
+                DELETE FROM mv_doctor_search WHERE user_id = OLD.user_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_doctor_search_name AFTER UPDATE OF full_name ON users
+            BEGIN
+                UPDATE mv_doctor_search
+                SET full_name = NEW.full_name, name_lower = lower(NEW.full_name)
+                WHERE user_id = NEW.id;
+            END
+            """
+        ]
+
+
+class DoctorSearchFTS:
+    """
+    Trigram full-text index over doctor name, specialization and qualification.
+    rowid is the doctor's user id. Kept in sync by triggers on users and doctor_details.
+    """
+    TABLE_NAME = "doctors_fts"
+    
+    @staticmethod
+    def create_table_sql():
+        # trigram matches any substring of 3+ characters, case-insensitively,
+        # which is what search_doctors' LIKE '%q%' used to scan for
+        return """
+        CREATE VIRTUAL TABLE IF NOT EXISTS doctors_fts USING fts5(
+            full_name, specialization, qualification,
+            tokenize = 'trigram'
+        )
+        """
+    
+    @staticmethod
+    def populate_sql(where=""):
+        return f"""
+        INSERT OR REPLACE INTO doctors_fts (rowid, full_name, specialization, qualification)
+        SELECT u.id, u.full_name, d.specialization, d.qualification
+        FROM users u
+        JOIN doctor_details d ON u.id = d.user_id
+        WHERE u.role = 'DOCTOR' {where}
+        """
+    
+    @staticmethod
+    def create_triggers_sql():
+        return [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_fts_ai AFTER INSERT ON doctor_details
+            BEGIN
+                {DoctorSearchFTS.populate_sql("AND d.user_id = NEW.user_id")};
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_fts_au AFTER UPDATE OF specialization, qualification ON doctor_details
+            BEGIN
+                {DoctorSearchFTS.populate_sql("AND d.user_id = NEW.user_id")};
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_fts_ad AFTER DELETE ON doctor_details
+            BEGIN
+                DELETE FROM doctors_fts WHERE rowid = OLD.user_id;
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_fts_name AFTER UPDATE OF full_name ON users
+            BEGIN
+                {DoctorSearchFTS.populate_sql("AND u.id = NEW.id")};
+            END
+            """
+        ]
+
+
+class PatientSearchFTS:
+    """
+    Trigram full-text index over patient name, email and phone.
+    rowid is the patient's user id. Kept in sync by triggers on users.
+    """
+    TABLE_NAME = "patients_fts"
+    
+    @staticmethod
+    def create_table_sql():
+        return """
+        CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            full_name, email, phone,
+            tokenize = 'trigram'
+        )
+        """
+    
+    @staticmethod
+    def populate_sql(where=""):
+        return f"""
+        INSERT OR REPLACE INTO patients_fts (rowid, full_name, email, phone)
+        SELECT id, full_name, email, phone
+        FROM users
+        WHERE role = 'PATIENT' {where}
+        """
+    
+    @staticmethod
+    def create_triggers_sql():
+        return [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_patients_fts_ai AFTER INSERT ON users
+            BEGIN
+                {PatientSearchFTS.populate_sql("AND id = NEW.id")};
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_patients_fts_au AFTER UPDATE OF full_name, email, phone ON users
+            BEGIN
+                {PatientSearchFTS.populate_sql("AND id = NEW.id")};
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_patients_fts_ad AFTER DELETE ON users
+            BEGIN
+                DELETE FROM patients_fts WHERE rowid = OLD.id;
+            END
+            """
         ]
 
 
@@ -293,9 +578,11 @@ class LabReport:
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_lab_patient ON lab_reports(patient_id)",
+            # Leading column of idx_lab_patient_type_date
+            "DROP INDEX IF EXISTS idx_lab_patient",
             "CREATE INDEX IF NOT EXISTS idx_lab_test_date ON lab_reports(test_date)",
-            "CREATE INDEX IF NOT EXISTS idx_lab_test_type ON lab_reports(test_type)"
+            "CREATE INDEX IF NOT EXISTS idx_lab_test_type ON lab_reports(test_type)",
+            "CREATE INDEX IF NOT EXISTS idx_lab_patient_type_date ON lab_reports(patient_id, test_type, test_date DESC)"
         ]
 
 
@@ -325,9 +612,11 @@ class VitalSign:
     @staticmethod
     def create_indexes_sql():
         return [
-            "CREATE INDEX IF NOT EXISTS idx_vitals_patient ON vital_signs(patient_id)",
+            # Leading column of idx_vitals_patient_type_time
+            "DROP INDEX IF EXISTS idx_vitals_patient",
             "CREATE INDEX IF NOT EXISTS idx_vitals_type ON vital_signs(vital_type)",
-            "CREATE INDEX IF NOT EXISTS idx_vitals_date ON vital_signs(recorded_at)"
+            "CREATE INDEX IF NOT EXISTS idx_vitals_date ON vital_signs(recorded_at)",
+            "CREATE INDEX IF NOT EXISTS idx_vitals_patient_type_time ON vital_signs(patient_id, vital_type, recorded_at DESC)"
         ]
 
 
@@ -374,7 +663,27 @@ ALL_MODELS = [
     Upload,
     Notification,
     DoctorRating,
+    DoctorSearch,
+    DoctorSearchFTS,
+    PatientSearchFTS,
     LabReport,
     VitalSign,
     MedicationReminder
 ]
+
+# Index and trigger DDL of every model, in ALL_MODELS order, built once at import
+INDEX_STATEMENTS = tuple(
+    sql for model in ALL_MODELS if hasattr(model, 'create_indexes_sql')
+    for sql in model.create_indexes_sql()
+)
+TRIGGER_STATEMENTS = tuple(
+    sql for model in ALL_MODELS if hasattr(model, 'create_triggers_sql')
+    for sql in model.create_triggers_sql()
+)
+
+# Full schema for a new database: tables first, then their indexes and triggers
+SCHEMA_STATEMENTS = (
+    tuple(model.create_table_sql() for model in ALL_MODELS)
+    + INDEX_STATEMENTS
+    + TRIGGER_STATEMENTS
+)
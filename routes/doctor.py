@@ -7,8 +7,8 @@ from database import (
     get_doctor_appointments, update_appointment_status, get_doctor_patients,
     get_patient_details, create_prescription, create_notification, execute_query,
     get_user_notifications, get_unread_notification_count, mark_notifications_as_read,
-    delete_read_notifications, get_doctor_stats, search_patients, mark_follow_up_required,
-    mark_follow_up_complete, generate_ics_calendar, get_doctor_today_appointments
+    delete_read_notifications, search_patients, mark_follow_up_required,
+    mark_follow_up_complete, generate_ics_calendar, get_doctor_dashboard_bundle
 )
 from scheduler import create_medication_reminder
 import json
@@ -25,17 +25,14 @@ def dashboard():
     user_id = session.get('user_id')
     full_name = session.get('full_name')
     
-    # Get statistics
-    stats = get_doctor_stats(user_id)
-    
-    # Get today's appointments
-    today_appointments = get_doctor_today_appointments(user_id)
+    # Statistics and today's appointments, read over one connection
+    dashboard = get_doctor_dashboard_bundle(user_id)
     
     return render_template('doctor_dashboard.html',
                          doctor_name=full_name,
                          doctor_id=user_id,
-                         stats=stats,
-                         today_appointments=today_appointments)
+                         stats=dashboard['stats'],
+                         today_appointments=dashboard['today_appointments'])
 
 
 @doctor_bp.route('/appointments')
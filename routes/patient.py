@@ -10,7 +10,7 @@ from database import (
     delete_uploaded_prescription as db_delete_uploaded_prescription,
     get_user_notifications, get_unread_notification_count, mark_notifications_as_read,
     delete_read_notifications,
-    create_rating, check_existing_rating, get_doctor_ratings, get_doctor_average_rating,
+    create_rating_if_absent, check_existing_rating, get_doctor_ratings, get_doctor_average_rating,
     search_doctors,
     create_lab_report, get_patient_lab_reports, get_lab_report_by_id, delete_lab_report,
     get_lab_report_trends, get_patient_history, execute_query,
@@ -283,12 +283,6 @@ def rate_doctor(appointment_id):
                 flash('Rating must be between 1 and 5.', 'danger')
                 return redirect(url_for('patient.rate_doctor', appointment_id=appointment_id))
             
-            # Check if already rated
-            existing_rating = check_existing_rating(patient_id, appointment_id)
-            if existing_rating:
-                flash('You have already rated this appointment.', 'warning')
-                return redirect(url_for('patient.appointments'))
-            
             # Get appointment details to get doctor_id
             query = "SELECT doctor_id, status FROM appointments WHERE id = ? AND patient_id = ?"
             appointment = execute_query(query, (appointment_id, patient_id), fetchone=True)
@@ -301,14 +295,17 @@ def rate_doctor(appointment_id):
                 flash('You can only rate completed or rejected appointments.', 'warning')
                 return redirect(url_for('patient.appointments'))
             
-            # Create rating
-            create_rating(
+            # Create rating, unless this appointment was already rated
+            rating_id = create_rating_if_absent(
                 doctor_id=appointment['doctor_id'],
                 patient_id=patient_id,
                 appointment_id=appointment_id,
                 rating=rating,
                 review_text=review_text if review_text else None
             )
+            if rating_id is None:
+                flash('You have already rated this appointment.', 'warning')
+                return redirect(url_for('patient.appointments'))
             
             flash('Thank you for your feedback!', 'success')
             return redirect(url_for('patient.appointments'))
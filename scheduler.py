@@ -5,7 +5,7 @@ Sends daily email reminders to patients about their medications
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask_mail import Mail, Message
 from datetime import datetime, timedelta
-from database import execute_query, get_ist_today, get_ist_now
+from database import execute_query, get_ist_today, get_ist_now, cleanup_read_notifications, refresh_doctor_averages
 import json
 
 
@@ -17,7 +17,7 @@ def send_followup_appointment_reminders():
     Send email reminders for follow-up appointments scheduled for today
     Runs daily at 7:00 AM IST
     """
-    today = get_ist_today().strftime('%Y-%m-%d')
+    today = get_ist_today().isoformat()
     
     # Get all follow-up appointments scheduled for today
     query = """
@@ -211,6 +211,27 @@ def init_scheduler(app):
         replace_existing=True
     )
     
+    # Purge old read notifications every hour
+    scheduler.add_job(
+        func=cleanup_read_notifications,
+        trigger='interval',
+        hours=1,
+        id='read_notification_cleanup',
+        name='Delete old read notifications',
+        replace_existing=True
+    )
+    
+    # Reconcile trigger-maintained doctor ratings with doctor_ratings nightly at 3:00 AM IST
+    scheduler.add_job(
+        func=refresh_doctor_averages,
+        trigger='cron',
+        hour=3,
+        minute=0,
+        id='doctor_rating_refresh',
+        name='Recompute doctor average ratings',
+        replace_existing=True
+    )
+    
     scheduler.start()
     print("✅ Medication & appointment reminder scheduler started!")
     
@@ -222,7 +243,7 @@ def send_daily_medication_reminders():
     Main job that runs daily at 8 AM
     Sends ONE email per patient with ALL their active medications
     """
-    today = get_ist_today().strftime('%Y-%m-%d')
+    today = get_ist_today().isoformat()
     
     # Get all active reminders for today
     query = """
@@ -288,13 +309,14 @@ def send_daily_medication_reminders():
     
     # Update last_sent_date for ALL reminders
     if reminder_ids:
-        placeholders = ','.join(['?' for _ in reminder_ids])
-        update_query = f"""
+        # IDs go in as one JSON array, so the SQL text (and its cached
+        # statement) is the same however many reminders were sent
+        update_query = """
             UPDATE medication_reminders
             SET last_sent_date = ?
-            WHERE id IN ({placeholders})
+            WHERE id IN (SELECT value FROM json_each(?))
         """
-        execute_query(update_query, (today, *reminder_ids), commit=True)
+        execute_query(update_query, (today, json.dumps(reminder_ids)), commit=True)
 
 
 def send_medication_email(patient_name, patient_email, all_medicines):
@@ -468,8 +490,8 @@ def create_medication_reminder(prescription_id, patient_id, max_duration_days):
     Create a medication reminder entry when prescription is created
     Called from routes/doctor.py after prescription creation
     """
-    start_date = get_ist_today().strftime('%Y-%m-%d')
-    end_date = (get_ist_today() + timedelta(days=max_duration_days)).strftime('%Y-%m-%d')
+    start_date = get_ist_today().isoformat()
+    end_date = (get_ist_today() + timedelta(days=max_duration_days)).isoformat()
     
     query = """
         INSERT INTO medication_reminders (prescription_id, patient_id, start_date, end_date, is_active)